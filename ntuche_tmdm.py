@@ -1,16 +1,58 @@
 import numpy as np
 import pandas as pd
 import os
+import re
+import sys
+import time
+import json
+import shutil
+import hashlib
+import tempfile
 import openpyxl
 import decimal
+import logging
+import contextlib
+import csv
+import itertools
+import codecs
 from openpyxl.utils.dataframe import dataframe_to_rows
 
+logger = logging.getLogger(__name__)
+
 class arrangement:
     """
     Parameters
     ----------
     grade_dict: dictionary, str:float
         將等第成績轉換為等第積分的字典
+    text_columns: list, str
+        讀取成績檔時需要去除前後空白的文字欄位
+    category_columns: list, str
+        讀取成績檔時轉為類別型態(category)的欄位
+    integer_columns: list, str
+        讀取成績檔時若全部都是整數, 就轉為最小整數型態(int8, int16...)的欄位
+    duplicate_columns: list, str
+        判斷相鄰兩筆成績是否重複時所比對的欄位
+    sidecar_suffix: str
+        成績總表暫存資料夾的副檔名, 暫存資料夾會放在成績檔旁邊 eg. 111輔系.xlsx.tmdm_cache
+    sidecar_version: int
+        暫存資料夾的格式版本, 格式或前處理方式改變時需要加1讓舊的暫存失效
+    delimited_extensions: dict, str:str
+        以分隔字元儲存的成績檔副檔名對應到分隔字元(其他副檔名的成績檔以excel讀取)
+    text_encodings: list, str
+        讀取csv/tsv成績檔時依序嘗試的文字編碼(第一個能解碼檔案開頭的編碼)
+    first_row: int
+        成績檔中第一筆成績所在的列號(前兩列與欄位名之後), 用於檢查結果中的列號
+    report_columns: list, str
+        成績檢查結果(validation_report)的欄位
+    report_limit: int
+        串流模式的檢查結果中每種問題最多保留的筆數(超過的只計算數量), 讓記憶體用量不隨成績筆數增加
+    transcript_columns: list, str
+        成績單(iter_transcripts)每一列的欄位, 最後的"三科"欄為該筆成績所屬的三科組名(列入三科平均時), 或組名加上"(重修前)"(被較新的成績取代時)
+    rank_keys: list, (str or tuple)
+        df_rankdata排名所依照的各種先後順序，順序由左到右; 每一項可以是欄位名稱(由大到小排名),
+        或是(欄位名稱, ascending)的tuple, ascending為True時由小到大排名;
+        欄位名稱也可以是以df_alldata為參數、回傳每位學生數值的函數 eg. lambda df: df.filter(like='總學分數').sum(axis=1)
     """
     
     grade_dict = {
@@ -26,7 +68,34 @@ class arrangement:
         'F':0.0
                  }
     
-    def __init__(self, grade_path, core_course1):
+    text_columns = ['學號', '學生姓名', '課程識別碼', '課名', '成績', '學生本學系']
+    
+    category_columns = ['學號', '學生姓名', '學生本學系', '課程識別碼', '課名', '成績']
+    
+    integer_columns = ['學年', '學期', '學分', '年級']
+    
+    duplicate_columns = ['學年', '學期', '學號', '課程識別碼', '學分']
+    
+    sidecar_suffix = '.tmdm_cache'
+    
+    sidecar_version = 5
+    
+    delimited_extensions = {'.csv':',', '.tsv':'\t', '.tab':'\t'}
+    
+    text_encodings = ['utf-8-sig', 'cp950']
+    
+    first_row = 4
+    
+    report_columns = ['列號', '學號', '欄位', '值', '問題', '錯誤']
+    
+    report_limit = 100
+    
+    transcript_columns = ['學號', '學生姓名', '學年', '學期', '課程識別碼', '課名', '學分', '成績', '等第積分', '三科']
+    
+    rank_keys = [('三科平均', False)]
+    
+    def __init__(self, grade_path, core_course1, streaming=False, sidecar=True, profile=False, profile_log=False, course_groups=None, cumulative_gpa=False, rolling_gpa=0, workers=None,\
+                 grade_map=None, skip_invalid=False):
         """
         
         初始化
@@ -35,13 +104,63 @@ class arrangement:
         Parameters
         ----------
         grade_path : str
-            學生成績的檔案路徑
+            學生成績的檔案路徑, 副檔名為.csv、.tsv或.tab時以文字檔讀取(內容與excel成績檔相同), 其他的以excel讀取
         __df_alldata : pd.DataFrame
             所有學生的所有平均分數資料
+        __cache : dict
+            已解析的成績總表、學期名稱與各學期成績表的暫存, 以及建立暫存時成績檔的修改時間、大小與內容雜湊值
+        parse_count : int
+            成績檔實際被解析(pd.read_excel)的次數
+        streaming : boolean
+            是否以串流方式逐列讀取成績檔來計算df_alldata(不會建立成績總表, 記憶體用量只和學生人數有關, 適合非常大的成績檔)
+        __df_alldata_stat : tuple, int
+            以串流方式計算df_alldata時成績檔的修改時間與檔案大小
+        sidecar : boolean
+            是否將整理好的成績總表以二進位欄位格式暫存在成績檔旁的資料夾, 下次執行時若成績檔內容沒變就直接讀取暫存
+        profile : boolean
+            是否記錄各階段的執行時間、呼叫次數、處理的資料列數與讀寫的位元組數(關閉時幾乎沒有額外負擔)
+        profile_log : boolean
+            記錄時是否在每個階段結束後以logging(logger名稱為ntuche_tmdm)輸出該次的紀錄
+        profile_stats : dict, str:dict
+            各階段累計的紀錄, 可由profile_report取得
+        course_groups : list, dict
+            計算三科平均的課程分組規則, 預設(None)為課名含有core_course1中任一字串且不是實驗課的一組;
+            每組為一個dict: name(組名), include(課名含有其中任一字串就屬於該組), exclude(課名含有其中任一字串就不屬於該組, 選用),
+            weight(該組在合併平均中的權重, 預設為1), credit_cap(該組最多採計的學分數, 從最新的成績開始採計, 預設不限制)
+            eg. [{'name':'微積分', 'include':['微積分']}, {'name':'物理化學', 'include':['普通物理學', '普通化學'], 'exclude':['實驗'], 'credit_cap':12}]
+            一門課依序屬於第一個符合的組, 有兩組以上時df_alldata會在三科平均(合併平均)前加上每組的平均
+        cumulative_gpa : boolean
+            df_alldata是否在每學期的總學分數後加上到該學期為止(依學年、學期由舊到新)所有科目的累計平均
+        rolling_gpa : int
+            df_alldata是否在每學期的總學分數後加上最近rolling_gpa個學期(包含該學期)所有科目的平均, 0代表不加
+        workers : int
+            計算每學期平均時同時執行的行程數, 大於1時將學生分成workers段, 各行程以共用記憶體(multiprocessing.shared_memory)直接讀取成績陣列,
+            結果與單一行程完全相同; 預設(None)為單一行程, 只有非常大的成績檔才值得開啟
+        grade_map : dict, str:(float or None)
+            grade_dict以外的等第成績對應的等第積分, 對應到None的等第成績視為沒有等第成績(不列入平均) eg. {'通過':None, 'W':None, 'X':0.0}
+        skip_invalid : boolean
+            檢查成績總表時發現無法計算的成績(未知的等第成績、學分不是數值、缺少學號)要略過這些成績, 否則產生ValueError
+        validation_report : pd.DataFrame
+            最近一次讀取成績檔(或update_gradedata)時的檢查結果, 欄位為report_columns, 每列為一筆有問題的成績
         """
         self.grade_path = grade_path
         self.core_course1 = core_course1
+        self.streaming = streaming
+        self.sidecar = sidecar
         self.__df_alldata = None
+        self.__df_alldata_stat = None
+        self.__cache = None
+        self.parse_count = 0
+        self.profile = profile
+        self.profile_log = profile_log
+        self.profile_stats = {}
+        self.course_groups = course_groups
+        self.cumulative_gpa = cumulative_gpa
+        self.rolling_gpa = rolling_gpa
+        self.workers = workers
+        self.grade_map = grade_map
+        self.skip_invalid = skip_invalid
+        self.validation_report = pd.DataFrame(columns=self.report_columns)
     
     @staticmethod
     def modify_round(x, dec=2):
@@ -65,6 +184,46 @@ class arrangement:
         rounded_x = x.quantize(decimal.Decimal(str(10**(-dec))), rounding=decimal.ROUND_HALF_UP)
         return float(rounded_x)
     
+    @staticmethod
+    def modify_round_array(x, dec=2):
+        """
+        
+        一次對整個陣列做四捨五入的函數, 結果與對每個值呼叫modify_round完全相同(包含4.165回傳4.17的情形)
+        modify_round是將str(x)的十進位數值四捨五入, 而str(x)是最短且能轉回x的十進位字串,
+        所以只要比較x與進位門檻(n+0.5)/10**dec最接近的浮點數, 就能知道str(x)是否大於等於門檻:
+        x大於等於門檻的浮點數時進位, 否則捨去(負數則對絕對值四捨五入)。
+        門檻的有效位數超過15位時無法保證此性質, 這些很大的值會改用modify_round逐一計算
+        
+        ----------
+        Parameters
+        ----------
+        x: np.array, float
+            想要取四捨五入的數值
+        dec: int
+            四捨五入的精確度(eg.想要取至小數點下第2位就設為2)
+        scale: float
+            10**dec
+        n: np.array, float
+            |x|*10**dec無條件捨去的整數
+        boundary: np.array, float
+            進位門檻(n+0.5)/10**dec最接近的浮點數
+        big: np.array, boolean
+            是否為需要逐一以modify_round計算的很大的值
+        rounded_x: np.array, float
+            取完四捨五入以後的數值
+        """
+        x = np.asarray(x, dtype=float)
+        scale = 10.0 ** dec
+        absx = np.abs(x)
+        n = np.floor(absx * scale)
+        boundary = ( 2 * n + 1 ) / ( 2 * scale ) # 分子與分母都是精確的浮點數, 相除的結果即為門檻最接近的浮點數
+        rounded_x = np.copysign(np.where(absx >= boundary, n + 1, n) / scale, x)
+        big = ~( absx < 10.0 ** (14 - dec) ) & np.isfinite(x)
+        if big.any():
+            rounded_x = np.array(rounded_x)
+            rounded_x[big] = [arrangement.modify_round(xi, dec) for xi in x[big]]
+        return rounded_x
+    
     @staticmethod
     def dedupe(items):
         """
@@ -83,398 +242,1762 @@ class arrangement:
                 yield item
                 seen.add(item)
     
-    @property
-    def df_gradedata(self): #學生成績
+    @staticmethod
+    def segment_sum(values, starts, lengths):
         """
         
-        將grade_path路徑中的學生成績轉為DataFrame並刪除重複的成績，呼叫此函數即可獲得所有學生所有成績的總表
+        將values依照連續的區段分別加總的函數
+        (將長度相同的區段排成二維陣列後一次以np.sum加總, 加總的順序與對每個區段各自呼叫np.sum完全相同, 因此四捨五入前的浮點數也會完全相同)
         
         ----------
         Parameters
         ----------
-        df_gradedata: pd.DataFrame
-            所有學生的成績總表
-        col: list, str
-            成績總表的欄位名稱
-        drop_index_list: list, int
-            含有所有重複成績的索引列表
-        sheetname: list, str
-            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        values: np.array, float
+            想要加總的數值
+        starts: np.array, int
+            每個區段在values中的起始位置
+        lengths: np.array, int
+            每個區段的長度
+        sums: np.array, float
+            每個區段的總和
         """
-        df_gradedata = pd.read_excel(self.grade_path).replace('\xa0\xa0', np.nan)
-        col = df_gradedata.iloc[1].to_list() # 取得欄位名
-        for i, coli in enumerate(col): # 若欄位名中有名為"課號"的欄，將其改為課程識別碼
-            if coli == '課號':
-                col[i] = '課程識別碼'
-        df_gradedata.columns = col
-        df_gradedata = df_gradedata.iloc[2:].reset_index(drop=True) # 刪除前兩列並重設index
-        drop_index_list = []
-        sheetname = []
-        for i in range(1, len(df_gradedata)): # 刪除重複成績並獲得每學期的名稱
-            if ( df_gradedata['學年'].iloc[i] == df_gradedata['學年'].iloc[i-1] ) and ( df_gradedata['學期'].iloc[i] == df_gradedata['學期'].iloc[i-1] )\
-             and ( df_gradedata['學號'].iloc[i] == df_gradedata['學號'].iloc[i-1] ) and ( df_gradedata['課程識別碼'].iloc[i] == df_gradedata['課程識別碼'].iloc[i-1] )\
-             and ( df_gradedata['學分'].iloc[i] == df_gradedata['學分'].iloc[i-1] ):
-                drop_index_list.append(i)
-            sheetnamei = str(df_gradedata['學年'].iloc[i]) + '_' + str(df_gradedata['學期'].iloc[i])
-            if sheetnamei not in sheetname:
-                sheetname.append(sheetnamei)
-        df_gradedata = df_gradedata.drop(index=drop_index_list).reset_index(drop=True)
-        return df_gradedata, sheetname
+        values = np.asarray(values, dtype=float)
+        starts = np.asarray(starts, dtype=np.intp)
+        lengths = np.asarray(lengths, dtype=np.intp)
+        sums = np.zeros(len(starts))
+        for length in np.unique(lengths[lengths > 0]):
+            selected = np.flatnonzero(lengths == length)
+            sums[selected] = values[starts[selected, None] + np.arange(length)].sum(axis=1)
+        return sums
     
-    @property
-    def df_gradedata_split(self): #學生成績
+    def stage(self, name):
         """
         
-        將df_gradedata中的成績總表分割為不同學期的成績表
+        記錄一個階段的context manager, 用法:
+            with self.stage('read_gradedata') as record:
+                ...
+                record['rows'] += len(df_gradedata)
+        離開時會將執行時間與呼叫次數累加到profile_stats[name], record中的rows、bytes_read與bytes_written也會一併累加;
+        未開啟profile時只回傳一個不會被記錄的空紀錄
+        (階段可以互相包含, 外層階段的時間包含內層階段的時間)
         
         ----------
         Parameters
         ----------
-        df_gradedata: pd.DataFrame
-            所有學生的成績總表
-        df_gradedata_split: list, pd.DataFrame
-            不同學期所有學生的成績表
-        sheetname: list, str
-            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        name: str
+            階段名稱
         """
-        df_gradedata, sheetname = self.df_gradedata
-        df_gradedata_split = []
-        for sheetnamei in sheetname:
-            year, semester = sheetnamei.split('_')
-            df_gradedata_spliti = df_gradedata.loc[(df_gradedata['學年'] == int(year)) & (df_gradedata['學期'] == int(semester))]
-            df_gradedata_split.append(df_gradedata_spliti.reset_index(drop=True))
-        return df_gradedata_split, sheetname
+        if not self.profile:
+            return contextlib.nullcontext({'rows':0, 'bytes_read':0, 'bytes_written':0})
+        return self.record_stage(name)
     
-    @property
-    def all_students_id_split(self): 
+    @contextlib.contextmanager
+    def record_stage(self, name):
         """
+        
+        stage開啟profile時實際使用的context manager
+        
+        ----------
         Parameters
         ----------
-        df_gradedata_split: list, pd.DataFrame
-            不同學期所有學生的成績表
-        sheetname: list, str
-            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
-        all_students_id_split: 2d list, str
-            不同學期所有學生的學號
+        name: str
+            階段名稱
+        record: dict, str:int
+            這次呼叫處理的資料列數與讀寫的位元組數
+        stats: dict, str:(int or float)
+            該階段累計的紀錄
+        seconds: float
+            這次呼叫的執行時間
         """
-        df_gradedata_split, sheetname = self.df_gradedata_split
-        all_students_id_split = []
-        for df_gradedata_spliti in df_gradedata_split:
-            all_students_id_split.append([i.strip() for i in self.dedupe((df_gradedata_spliti['學號']))])
-        return all_students_id_split
+        record = {'rows':0, 'bytes_read':0, 'bytes_written':0}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            stats = self.profile_stats.setdefault(name, {'calls':0, 'seconds':0.0, 'rows':0, 'bytes_read':0, 'bytes_written':0})
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            for item, value in record.items():
+                stats[item] += int(value)
+            if self.profile_log:
+                logger.info('%s: %.4f s, %d rows, %d bytes read, %d bytes written', name, seconds, record['rows'], record['bytes_read'], record['bytes_written'])
     
-    @property
-    def all_students_id(self): 
+    def profile_report(self, as_json=False):
         """
+        
+        回傳各階段的累計紀錄(依第一次呼叫的順序排列)
+        
+        ----------
         Parameters
         ----------
-        all_students_id_split: 2d list, str
-            不同學期所有學生的學號
-        all_students_id: list, str
-            所有學生的學號
+        as_json: boolean
+            是否回傳JSON字串, 否則回傳dict
+        report: dict, str:dict
+            各階段的呼叫次數(calls)、總秒數(seconds)、資料列數(rows)與讀寫的位元組數(bytes_read, bytes_written)
         """
-        all_students_id_split = self.all_students_id_split
-        all_students_id = list(self.dedupe(sum(all_students_id_split, [])))
-        return all_students_id
+        report = {name:dict(stats) for name, stats in self.profile_stats.items()}
+        if as_json:
+            return json.dumps(report, ensure_ascii=False, indent=2)
+        return report
     
-    @property
-    def all_students_name_split(self):
+    def file_stat(self):
         """
+        
+        取得成績檔的修改時間與檔案大小, 用來快速判斷暫存是否過期
+        
+        ----------
         Parameters
         ----------
-        df_gradedata_split: list, pd.DataFrame
-            不同學期所有學生的成績表
-        sheetname: list, str
-            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
-        all_students_name_split: 2d list, str
-            不同學期所有學生的姓名
+        stat: os.stat_result
+            成績檔的檔案資訊
         """
-        df_gradedata_split, sheetname = self.df_gradedata_split
-        all_students_name_split = []
-        for df_gradedata_spliti in df_gradedata_split:
-            all_students_name_split.append([i.strip() for i in self.dedupe((df_gradedata_spliti['學生姓名']))])
-        return all_students_name_split
+        stat = os.stat(self.grade_path)
+        return stat.st_mtime_ns, stat.st_size
     
-    @property
-    def all_students_name(self):
+    def file_hash(self, chunk_size=1<<20):
         """
+        
+        計算成績檔內容的SHA-256雜湊值
+        
+        ----------
         Parameters
         ----------
-        all_students_name_split: 2d list, str
-            不同學期所有學生的姓名
-        all_students_name: list, str
-            所有學生的姓名
+        chunk_size: int
+            每次讀取的位元組數
+        sha: hashlib.sha256
+            雜湊值物件
         """
-        all_students_name_split = self.all_students_name_split
-        all_students_name = list(self.dedupe(sum(all_students_name_split, [])))
-        return all_students_name
+        sha = hashlib.sha256()
+        with self.stage('file_hash') as record, open(self.grade_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+                record['bytes_read'] += len(chunk)
+        return sha.hexdigest()
     
-    @property
-    def all_students_year_split(self):
+    def clear_cache(self):
         """
-        Parameters
-        ----------
-        df_gradedata_split: list, pd.DataFrame
-            不同學期所有學生的成績表
-        sheetname: list, str
-            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
-        all_students_year_split: 2d list, str
-            不同學期所有學生的年級
+        
+        清除已解析的成績總表與計算結果的暫存, 下次存取時會重新讀取成績檔
         """
-        df_gradedata_split, sheetname = self.df_gradedata_split
-        all_students_id_split = self.all_students_id_split
-        all_students_year_split = []
-        for df_gradedata_spliti, all_students_idi in zip(df_gradedata_split, all_students_id_split):
-            all_students_year = []
-            for students_id in all_students_idi:
-                try:
-                    students_year = df_gradedata_spliti[df_gradedata_spliti['學號']==students_id]['年級'].iloc[0]
-                except:
-                    students_year = np.nan
-                all_students_year.append(students_year)
-            all_students_year_split.append(all_students_year)
-        return all_students_year_split
+        self.__cache = None
+        self.__df_alldata = None
     
-    @property
-    def all_students_year(self):
+    def load_gradedata(self):
         """
+        
+        回傳暫存中的成績總表, 若尚未解析或成績檔已被修改則重新解析
+        (成績檔的修改時間或大小改變時會再比對內容雜湊值, 內容相同就只更新修改時間, 不重新解析)
+        
+        ----------
         Parameters
         ----------
-        all_students_name_split: 2d list, str
-            不同學期所有學生的姓名
-        all_students_year: list, str
-            所有學生的年級
+        stat: tuple, int
+            成績檔目前的修改時間與檔案大小
+        digest: str
+            成績檔內容的雜湊值
+        sidecar_key: str
+            暫存資料夾的識別碼
+        gradedata: tuple
+            成績總表與學期名稱
+        cache: dict
+            已解析的成績總表暫存
         """
-        df_gradedata_split, sheetname = self.df_gradedata_split
-        all_students_id = self.all_students_id
-        all_students_year = []
-        for students_id in all_students_id:
-            students_year = None
-            for df_gradedata_spliti in df_gradedata_split:
-                try:
-                    students_year = df_gradedata_spliti[df_gradedata_spliti['學號']==students_id]['年級'].iloc[0]
-                except:
-                    students_year = None
-                if students_year is not None:
-                    all_students_year.append(students_year)
-                    break
-        return all_students_year
+        stat = self.file_stat()
+        cache = self.__cache
+        if cache is not None and cache['stat'] != stat:
+            digest = self.file_hash()
+            if digest == cache['hash']: # 只有修改時間改變(eg.重新存檔), 內容沒有變
+                cache['stat'] = stat
+            else:
+                self.clear_cache()
+                cache = None
+        if cache is None:
+            with self.stage('load_gradedata'):
+                digest = self.file_hash()
+                sidecar_key = self.sidecar_key(digest)
+                gradedata = self.load_sidecar(sidecar_key) if self.sidecar else None
+                if gradedata is None:
+                    gradedata = self.read_gradedata()
+                    if self.sidecar:
+                        self.save_sidecar(*gradedata, sidecar_key)
+                df_gradedata, sheetname = gradedata
+                cache = {'stat':stat, 'hash':digest, 'df_gradedata':df_gradedata, 'sheetname':sheetname, 'semester_rows':None, 'df_core1':None, 'student_lookup':None}
+                self.__cache = cache
+        return cache
     
     @property
-    def all_students_department_split(self):
+    def sidecar_path(self):
+        """
+        
+        成績總表暫存資料夾的路徑 eg. 111輔系.xlsx.tmdm_cache
+        """
+        return self.grade_path + self.sidecar_suffix
+    
+    def sidecar_key(self, digest):
         """
+        
+        暫存資料夾的識別碼, 由成績檔內容的雜湊值、暫存格式版本與前處理設定組成,
+        只要其中一項改變(成績檔內容被修改、程式更新格式、等第積分表改變...), 舊的暫存就會失效並重新解析成績檔
+        
+        ----------
         Parameters
         ----------
-        df_gradedata_split: list, pd.DataFrame
-            不同學期所有學生的成績表
-        sheetname: list, str
-            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
-        all_students_id_split: 2d list, str
-            不同學期所有學生的學號
-        all_students_department_split: 2d list, str
-            不同學期所有學生的系所名稱
+        digest: str
+            成績檔內容的雜湊值
+        setting: str
+            暫存格式版本與前處理設定
         """
-        df_gradedata_split, sheetname = self.df_gradedata_split
-        all_students_id_split = self.all_students_id_split
-        all_students_department_split = []
-        for df_gradedata_spliti, all_students_idi in zip(df_gradedata_split, all_students_id_split):
-            all_students_department = []
-            for students_id in all_students_idi:
-                try:
-                    students_department = df_gradedata_spliti[df_gradedata_spliti['學號']==students_id]['學生本學系'].iloc[0].strip()
-                except:
-                    students_department = np.nan
-                all_students_department.append(students_department)
-            all_students_department_split.append(all_students_department)
-        return all_students_department_split
+        setting = json.dumps([self.sidecar_version, self.grade_points, self.skip_invalid, self.text_columns, self.category_columns, self.integer_columns, self.duplicate_columns], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256((digest + setting).encode('utf-8')).hexdigest()
     
-    @property
-    def all_students_department(self):
+    def save_sidecar(self, df_gradedata, sheetname, sidecar_key):
         """
+        
+        將整理好的成績總表以NumPy的.npy欄位檔存入成績檔旁的暫存資料夾:
+        數值欄直接存檔, 類別欄與其他欄位存成整數代碼, 代碼對應的值(類別)則存在meta.json中,
+        暫存中沒有任何pickle的物件, 讀取時不會執行暫存資料夾中的程式碼
+        (先寫到暫時資料夾再改名, 寫到一半中斷也不會留下損毀的暫存; 無法寫入或有JSON無法儲存的值時則略過, 不影響計算)
+        
+        ----------
         Parameters
         ----------
-        df_gradedata_split: list, pd.DataFrame
-            不同學期所有學生的成績表
+        df_gradedata: pd.DataFrame
+            所有學生的成績總表
         sheetname: list, str
             含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
-        all_students_id: list, str
-            所有學生的學號
-        all_students_department: list, str
-            所有學生的系所名稱
+        sidecar_key: str
+            暫存資料夾的識別碼
+        tmpdir: str
+            暫時資料夾的路徑
+        columns: list, dict
+            每個欄位的名稱、存檔方式與類別
+        codes: np.ndarray, int
+            類別欄或其他欄位的代碼(-1代表NaN)
+        categories: pd.Index
+            代碼對應的值
         """
-        df_gradedata_split, sheetname = self.df_gradedata_split
-        all_students_id = self.all_students_id
-        all_students_department = []
-        for students_id in all_students_id:
-            students_department = None
-            for df_gradedata_spliti in df_gradedata_split:
-                try:
-                    students_department = df_gradedata_spliti[df_gradedata_spliti['學號']==students_id]['學生本學系'].iloc[0].strip()
-                except:
-                    students_department = None
-                if students_department is not None:
-                    all_students_department.append(students_department)
-                    break
-        return all_students_department
+        with self.stage('save_sidecar') as record:
+            sidecar_path = self.sidecar_path
+            try:
+                tmpdir = tempfile.mkdtemp(prefix='.tmdm_', dir=os.path.dirname(os.path.abspath(sidecar_path)))
+            except OSError:
+                return
+            try:
+                columns = []
+                for i, coli in enumerate(df_gradedata.columns):
+                    series = df_gradedata[coli]
+                    if series.dtype.kind in 'biuf':
+                        np.save(os.path.join(tmpdir, 'col%d.npy' % i), series.to_numpy(), allow_pickle=False)
+                        columns.append({'name':coli, 'kind':'numeric'})
+                        continue
+                    if isinstance(series.dtype, pd.CategoricalDtype):
+                        codes, categories = series.cat.codes.to_numpy(), series.cat.categories
+                        columns.append({'name':coli, 'kind':'category', 'categories':categories.tolist()})
+                    else:
+                        codes, categories = pd.factorize(series.to_numpy(dtype=object))
+                        columns.append({'name':coli, 'kind':'object', 'categories':pd.Index(categories, dtype=object).tolist()})
+                    np.save(os.path.join(tmpdir, 'col%d.npy' % i), codes, allow_pickle=False)
+                with open(os.path.join(tmpdir, 'meta.json'), 'w', encoding='utf-8') as f:
+                    json.dump({'key':sidecar_key, 'sheetname':sheetname, 'nrows':len(df_gradedata), 'columns':columns,\
+                               'report':json.loads(self.validation_report.to_json(orient='records', force_ascii=False))}, f, ensure_ascii=False)
+                if os.path.isdir(sidecar_path):
+                    shutil.rmtree(sidecar_path)
+                record['rows'] += len(df_gradedata)
+                record['bytes_written'] += sum(entry.stat().st_size for entry in os.scandir(tmpdir))
+                os.rename(tmpdir, sidecar_path)
+            except (OSError, TypeError, ValueError):
+                shutil.rmtree(tmpdir, ignore_errors=True)
     
-    def calc_allavg(self, student_id, full_output=False):
+    def load_sidecar(self, sidecar_key):
         """
         
-        計算一個學生每個學期所有科目的總平均
+        從暫存資料夾讀取成績總表, 若暫存不存在、識別碼不符(成績檔或設定已改變)或暫存損毀則回傳None
         
         ----------
         Parameters
         ----------
-        student_id: str
-            學生的學號
-        full_output: boolean
-            是否需要輸出學生的總學分數
-        grade_dict: dictionary, str:float
-            將等第成績轉換為等第積分的字典
-        df_gradedata_split: list, pd.DataFrame
-            不同學期所有學生的成績表
-        allcredits: np.array, int
-            不同學期學生的總學分數
-        allavgs: np.array, float
-            不同學期學生所有科目的平均分數
-        allcredit: np.array, int
-            學生的總學分數
-        allavg: np.array, float
-            學生所有科目的平均分數
-        grade: np.array, float
-            學生各科的成績(等第積分)
-        credit: np.array, int
-            學生各科的學分數
-        flag: boolean
-            是否已搜尋到此學生的資料
-        """
-        grade_dict = self.grade_dict
-        df_gradedata_split, _ = self.df_gradedata_split
-        allcredits = np.array([])
-        allavgs = np.array([])
-        for df_gradedata_spliti in df_gradedata_split:
-            grade = np.array([])
-            credit = np.array([])
-            flag = False
-            for (ide, cde, gne) in zip(df_gradedata_spliti['學號'], df_gradedata_spliti['學分'], df_gradedata_spliti['成績']):
-                if ( ide.strip() == student_id ) and ( type(gne) is str ):
-                    grade = np.append(grade, grade_dict[gne.strip()])
-                    credit = np.append(credit, cde)
-                    flag = True
-                if ide.strip() != student_id and flag:
-                    break
-            allcredit = sum(credit)
-            allavg = np.sum( grade * credit ) / allcredit if ( grade.size != 0 ) and ( allcredit != 0 ) else 0
-            allavg = self.modify_round(allavg)
-            allcredits = np.append(allcredits, allcredit)
-            allavgs = np.append(allavgs, allavg)
-        if full_output:
-            return allavgs, allcredits
-        else:
-            return allavgs
+        sidecar_key: str
+            暫存資料夾的識別碼
+        meta: dict
+            暫存資料夾的識別碼、學期名稱與欄位資訊
+        data: dict
+            讀取後的各欄資料
+        codes: np.ndarray, int
+            類別欄或其他欄位的代碼(-1代表NaN)
+        categories: pd.Index
+            代碼對應的值
+        """
+        with self.stage('load_sidecar') as record:
+            sidecar_path = self.sidecar_path
+            try:
+                with open(os.path.join(sidecar_path, 'meta.json'), encoding='utf-8') as f:
+                    meta = json.load(f)
+                if meta['key'] != sidecar_key:
+                    return None
+                data = {}
+                for i, columni in enumerate(meta['columns']):
+                    values = np.load(os.path.join(sidecar_path, 'col%d.npy' % i), allow_pickle=False)
+                    if columni['kind'] == 'numeric':
+                        data[i] = values
+                        continue
+                    codes, categories = values, pd.Index(columni['categories'], dtype=object)
+                    data[i] = pd.Categorical.from_codes(codes, categories=categories)
+                    if columni['kind'] == 'object':
+                        data[i] = np.asarray(data[i], dtype=object)
+                record['bytes_read'] += sum(entry.stat().st_size for entry in os.scandir(sidecar_path))
+                record['rows'] += meta['nrows']
+                df_gradedata = pd.DataFrame(data, index=pd.RangeIndex(meta['nrows']))
+                df_gradedata.columns = [columni['name'] for columni in meta['columns']]
+                report = pd.DataFrame(meta['report'], columns=self.report_columns, dtype=object)
+                self.validation_report = report.where(report.notna(), np.nan).astype({'列號':int, '錯誤':bool})
+                return df_gradedata, meta['sheetname']
+            except (OSError, KeyError, ValueError, TypeError, EOFError):
+                return None
     
-    def calc_core1avg(self, student_id, full_output=False):
+    def read_gradedata(self):
         """
         
-        計算一個學生的微積分、普通物理學與普通化學的三科平均
+        將grade_path路徑中的學生成績轉為DataFrame並整理成成績總表(每呼叫一次就會重新解析一次成績檔)
         
         ----------
         Parameters
         ----------
-        student_id: str
-            學生的學號
-        full_output: boolean
-            是否需要輸出學生的各個必修課目的課程名稱、等第成績、等第積分與學分數資料
-        grade_dict: dictionary, str:float
-            將等第成績轉換為等第積分的字典
-        df_gradedata_split: list, pd.DataFrame
-            不同學期所有學生的成績表
+        df_gradedata: pd.DataFrame
+            所有學生的成績總表
+        col: list, str
+            成績總表的欄位名稱
         sheetname: list, str
             含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
-        core_course1 : list, str
-            本校所有微積分、普通化學與普通物理學課名的共通字串
-        core_course1_name: list, str
-            學生修習的微積分、普通化學或普通物理學課名
-        grade: np.array, float
-            學生修習的微積分、普通化學或普通物理學成績(等第積分)
-        credit: np.array, int
-            學生修習的微積分、普通化學或普通物理學的學分數
-        gdcddata: list, str
-            學生修習的微積分、普通化學或普通物理學的"等第成績 等第積分 學分數"
-        flag: boolean
-            是否已搜尋到此學生的資料
-        core1credit: int
-            學生修習微積分、普通化學或普通物理學的總學分數
-        core1avg: float
-            學生修習的微積分、普通化學或普通物理學的平均分數
-        fulldata: dict, tuple, str
-            包含學生修習的微積分、普通化學或普通物理學的課程名稱、等第成績、等第積分與學分數, 等第成績代表A+, A, A-, ...等
         """
-        grade_dict = self.grade_dict
-        df_gradedata_split, sheetname = self.df_gradedata_split
-        core_course1 = self.core_course1
-        core_course1_name = []
-        grade = np.array([])
-        credit = np.array([])
-        gdcddata = []
-        for df_gradedata_spliti, sheetnamei in zip(df_gradedata_split, sheetname):
-            flag = False
-            for (ide, cne, cde, gne) in zip(df_gradedata_spliti['學號'], df_gradedata_spliti['課名'], df_gradedata_spliti['學分'], df_gradedata_spliti['成績']):
-                # print(cne, type(cne))
-                if ( ide.strip() == student_id ) and ( type(gne) is str ) and ( type(cne) is str ):
-                    if ( ( core_course1[0] in cne ) or ( core_course1[1] in cne ) or ( core_course1[2] in cne ) ) and ( '實驗' not in cne ) and ( cne not in core_course1_name ): # 若重複修習相同課名, 取最新的資料
-                        core_course1_name.append(cne.strip())
-                        gde = grade_dict[gne.strip()]
-                        grade = np.append(grade, gde)
-                        credit = np.append(credit, cde)
-                        gdcddata.append(gne.strip() + ' ' + str(gde).strip() + ' ' + str(cde).strip())
-                        flag = True
-                if ide.strip() != student_id and flag:
-                    break
-        core1credit = sum(credit)
-        core1avg = np.sum( grade * credit ) / core1credit if ( grade.size != 0 ) and ( core1credit != 0 ) else 0
-        core1avg = self.modify_round(core1avg)
-        if full_output:
-            fulldata = dict(zip(core_course1_name, gdcddata))
-            return core1avg, fulldata
+        if self.delimiter is not None:
+            with self.stage('read_delimited') as record:
+                df_gradedata = self.read_delimited()
+                record['rows'] += len(df_gradedata)
+                record['bytes_read'] += os.path.getsize(self.grade_path)
         else:
-            return core1avg
+            with self.stage('read_excel') as record:
+                df_gradedata = pd.read_excel(self.grade_path).replace('\xa0\xa0', np.nan)
+                record['rows'] += len(df_gradedata)
+                record['bytes_read'] += os.path.getsize(self.grade_path)
+        self.parse_count += 1
+        col = df_gradedata.iloc[1].to_list() # 取得欄位名
+        for i, coli in enumerate(col): # 若欄位名中有名為"課號"的欄，將其改為課程識別碼
+            if coli == '課號':
+                col[i] = '課程識別碼'
+        df_gradedata.columns = col
+        df_gradedata = df_gradedata.iloc[2:].reset_index(drop=True) # 刪除前兩列並重設index
+        if self.delimiter is not None: # 文字檔中的數值都是字串, 和pd.read_excel一樣轉為數值
+            for coli in df_gradedata.columns:
+                if coli not in self.text_columns:
+                    df_gradedata[coli] = self.coerce_numeric(df_gradedata[coli])
+        return self.normalize_gradedata(df_gradedata, self.first_row)
     
+    @property
+    def delimiter(self):
+        """
+        
+        依成績檔的副檔名決定的分隔字元, 不是csv/tsv成績檔時為None
+        """
+        return self.delimited_extensions.get(os.path.splitext(self.grade_path)[1].lower())
     
-    def get_df_alldata(self):
+    def delimited_encoding(self, prefix_size=1<<16):
         """
         
-        獲得所有學生的所有平均分數以及修習的三科資料總表
+        依序以text_encodings中的編碼解碼csv/tsv成績檔的前prefix_size個位元組, 回傳第一個能解碼的編碼
+        (只讀取檔案開頭, 不必為了判斷編碼把整個檔案多解碼一次; 中文欄位名稱在第2列, 開頭就足以分辨UTF-8與Big5)
         
         ----------
         Parameters
         ----------
-        all_students_id: list, str
-            所有學生的學號
-        all_students_name: list, str
-            所有學生的姓名
-        all_students_department: list, str
-            所有學生的系所名稱
-        all_students_year: list, str
-            所有學生的年級
-        df_gradedata_split: list, pd.DataFrame
-            不同學期所有學生的成績表
-        sheetname: list, str
-            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
-        all_allavg: list, np.array, float or 2d np.array, float
-            所有學生每學期的的全科目平均分數
-        all_allcredit: list, np.array, int or 2d np.array, int
-            所有學生每學期的的總學分數
-        all_core1avg: list, float
-            所有學生的微積分、普通化學與普通物理學平均分數
-        df_corse1data: pd.DataFrame
-            所有學生修習的微積分、普通化學與普通物理學課程的等第成績、等第積分與學分數總表
-        sheetname_new: list, str
-            含有所有學期名稱平均和總學分數名稱的列表，為df_alldata中一部分的欄位名稱
-        column: list, str
-            df_avgdata的欄位名稱
+        prefix_size: int
+            用來判斷編碼的位元組數
+        prefix: bytes
+            成績檔開頭的位元組
+        decoder: codecs.IncrementalDecoder
+            可以分段解碼(開頭最後被切斷的多位元組字不會被當成錯誤)的解碼器
+        """
+        with open(self.grade_path, 'rb') as f:
+            prefix = f.read(prefix_size)
+        for encoding in self.text_encodings:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                decoder.decode(prefix, final=len(prefix) < prefix_size)
+            except UnicodeDecodeError:
+                continue
+            return encoding
+        raise ValueError('無法以%s解碼成績檔: %s' % ('、'.join(self.text_encodings), self.grade_path))
+    
+    def read_delimited(self):
+        """
+        
+        以pandas的C語言讀取器一次讀取整個csv/tsv成績檔(與pd.read_excel相同, 整個表格都會放在記憶體中; 需要控制記憶體時請使用串流模式),
+        回傳的表格與pd.read_excel讀取相同內容的xlsx檔時相同: 第1列(標題)作為欄位名稱而不在表格中, 空白與'\xa0\xa0'為NaN, 其餘的值都還是字串
+        
+        ----------
+        Parameters
+        ----------
+        encoding: str
+            成績檔的文字編碼
+        n_rows: int
+            計算欄位數時讀取的列數(None為所有列)
+        n_columns: int
+            欄位數(讀取的列中最多的欄位數, 讓只有一欄的標題列也能讀取)
+        df_gradedata: pd.DataFrame
+            成績檔的所有資料
+        """
+        encoding = self.delimited_encoding()
+        for n_rows in [3, None]: # 先以前三列的欄位數讀取, 後面有欄位數更多的列(ParserError)時再以所有列中最多的欄位數重新讀取
+            try:
+                with open(self.grade_path, newline='', encoding=encoding) as f:
+                    n_columns = max([len(values) for values in itertools.islice(csv.reader(f, delimiter=self.delimiter), n_rows)] + [1])
+                df_gradedata = pd.read_csv(self.grade_path, sep=self.delimiter, header=None, names=range(n_columns), dtype=str, encoding=encoding,\
+                                           keep_default_na=False, na_values=['', '\xa0\xa0'], skip_blank_lines=False, engine='c')
+                break
+            except pd.errors.ParserError:
+                if n_rows is None:
+                    raise
+            except UnicodeDecodeError: # 檔案開頭能以encoding解碼, 後面卻不行(混用了不同的編碼)
+                raise ValueError('成績檔無法以%s解碼: %s' % (encoding, self.grade_path))
+        return df_gradedata.iloc[1:].reset_index(drop=True)
+    
+    @staticmethod
+    def coerce_numeric(series):
+        """
+        
+        將文字檔讀入的字串欄位轉為數值: 全部都是數值時轉為數值欄位(整數或浮點數), 否則只把能轉為數值的值換成數值
+        
+        ----------
+        Parameters
+        ----------
+        series: pd.Series, str
+            一個欄位的值
+        numeric: pd.Series, (int or float)
+            轉換後的數值(不能轉換的為NaN)
+        values: pd.Series, object
+            轉換後的數值, 整數值的浮點數轉為整數(與parse_number及pd.read_excel相同)
+        integral: pd.Series, boolean
+            該值是否為整數值
+        """
+        numeric = pd.to_numeric(series, errors='coerce')
+        if numeric.notna().sum() == series.notna().sum():
+            return numeric
+        values = numeric.astype(object)
+        integral = ( numeric % 1 ).eq(0)
+        values[integral] = [int(value) for value in numeric[integral].tolist()]
+        return series.where(numeric.isna(), values)
+    
+    def normalize_gradedata(self, df_gradedata, first_row=1):
+        """
+        
+        成績總表的前處理, 只在讀取成績檔時做一次:
+        1. 去除文字欄位前後的空白, 並刪除每一格都是空白的列(與iter_gradedata相同, 檢查結果中的列號仍為原本的列號)
+        2. 以validate_gradedata檢查所有成績, 有無法計算的成績時產生ValueError(skip_invalid為True時略過這些成績)
+        3. 將等第成績轉換為等第積分並存於"等第積分"欄(沒有等第成績的為NaN)
+        4. 刪除相鄰且學年、學期、學號、課程識別碼與學分都相同的重複成績
+        5. 將學號、姓名、系所、課程與等第成績等欄位轉為類別型態
+        6. 將學年、學期、學分與年級等整數欄位轉為最小的整數型態
+        
+        ----------
+        Parameters
+        ----------
+        df_gradedata: pd.DataFrame
+            已設定欄位名稱的成績總表
+        first_row: int
+            第一筆成績的列號(檢查結果中的列號由此開始)
+        grade_points: dictionary, str:(float or None)
+            將等第成績轉換為等第積分的字典(grade_dict加上grade_map)
+        blank: np.array, boolean
+            該列是否每一格都是空白
+        row_number: np.array, int
+            每筆成績在成績檔中的列號
+        report: pd.DataFrame
+            validate_gradedata的檢查結果
+        invalid: np.array, boolean
+            該筆成績是否無法計算
+        is_str: pd.Series, boolean
+            該欄中的值是否為字串
+        graded: pd.Series, boolean
+            該筆成績是否有等第成績
+        grade: pd.Series, float
+            有等第成績的等第積分
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        """
+        with self.stage('normalize_gradedata') as record:
+            record['rows'] += len(df_gradedata)
+            grade_points = self.grade_points
+            df_gradedata = df_gradedata.copy()
+            for coli in self.text_columns: # 去除文字欄位前後的空白
+                if coli in df_gradedata:
+                    is_str = df_gradedata[coli].map(type).eq(str)
+                    if is_str.any():
+                        df_gradedata[coli] = df_gradedata[coli].astype(object)
+                        df_gradedata.loc[is_str, coli] = df_gradedata.loc[is_str, coli].str.strip()
+            blank = df_gradedata.isna().all(axis=1).to_numpy()
+            row_number = np.flatnonzero(~blank) + first_row
+            if blank.any(): # 刪除每一格都是空白的列
+                df_gradedata = df_gradedata[~blank].reset_index(drop=True)
+            report, invalid = self.validate_gradedata(df_gradedata, row_number)
+            self.check_report(report)
+            if invalid.any():
+                df_gradedata = df_gradedata[~invalid].reset_index(drop=True)
+            graded = df_gradedata['成績'].map(type).eq(str)
+            grade = df_gradedata.loc[graded, '成績'].map(grade_points) # 對應到None的等第成績為NaN
+            df_gradedata['等第積分'] = grade.reindex(df_gradedata.index).astype(float)
+            df_gradedata = self.drop_adjacent_duplicates(df_gradedata) # 刪除重複成績
+            for coli in self.category_columns:
+                if coli in df_gradedata:
+                    df_gradedata[coli] = df_gradedata[coli].astype('category')
+            df_gradedata = self.compact_gradedata(df_gradedata)
+            sheetname = pd.unique(df_gradedata['學年'].astype(str) + '_' + df_gradedata['學期'].astype(str)).tolist() # 獲得每學期的名稱
+        return df_gradedata, sheetname
+    
+    @property
+    def grade_points(self):
+        """
+        
+        將等第成績轉換為等第積分的字典: grade_dict加上grade_map(對應到None的等第成績視為沒有等第成績)
+        """
+        return {**self.grade_dict, **( self.grade_map or {} )}
+    
+    def validate_gradedata(self, df_gradedata, first_row=1):
+        """
+        
+        在計算任何平均之前, 以向量化的方式一次檢查整個成績總表, 回傳所有有問題的成績(而不只是第一筆):
+        1. 未知的等第成績: 不在grade_dict與grade_map中的等第成績 eg. 'X'、'W'、'通過'
+        2. 學分不是數值: 學分不是數值, 或有等第成績但沒有學分
+        3. 缺少學號: 有其他資料但沒有學號
+        4. 學生成績不連續: 同一個學生同一學期的成績被其他學生的成績隔開(只是提醒, 不影響計算; 只列出每段被隔開的成績的第一列)
+        前三種為無法計算的成績(錯誤欄為True)
+        
+        ----------
+        Parameters
+        ----------
+        df_gradedata: pd.DataFrame
+            已設定欄位名稱並去除空白的成績總表
+        first_row: int or np.array, int
+            第一筆成績的列號, 或每筆成績的列號(刪除空白列後列號不連續時)
+        row_number: np.array, int
+            每筆成績的列號
+        graded: pd.Series, boolean
+            該筆成績是否有等第成績(字串)
+        credit: pd.Series, float
+            轉為數值後的學分數(不是數值的為NaN)
+        student_id: pd.Series
+            學號
+        checks: list, tuple
+            每一種檢查的(有問題的成績, 欄位, 問題, 是否為錯誤)
+        invalid: np.array, boolean
+            該筆成績是否無法計算
+        valid: np.array, int
+            可以計算的成績的位置
+        block: np.array, int
+            每筆可以計算的成績的(學年, 學期, 學號)分組代號
+        start: np.array, int
+            每段連續相同分組的成績的第一列位置
+        report: pd.DataFrame
+            所有有問題的成績, 依列號排列
+        """
+        with self.stage('validate_gradedata') as record:
+            record['rows'] += len(df_gradedata)
+            row_number = np.arange(len(df_gradedata)) + first_row if np.isscalar(first_row) else np.asarray(first_row)
+            graded = df_gradedata['成績'].map(type).eq(str)
+            credit = pd.to_numeric(df_gradedata['學分'], errors='coerce')
+            student_id = df_gradedata['學號']
+            checks = [
+                (( graded & ~df_gradedata['成績'].isin(list(self.grade_points)) ).to_numpy(), '成績', '未知的等第成績', True),
+                (( credit.isna() & ( df_gradedata['學分'].notna() | graded ) ).to_numpy(), '學分', '學分不是數值', True),
+                (( ( student_id.isna() | student_id.eq('') ) & df_gradedata.drop(columns='學號').notna().any(axis=1) ).to_numpy(), '學號', '缺少學號', True),
+                ]
+            invalid = np.logical_or.reduce([selected for selected, _, _, _ in checks])
+            valid = np.flatnonzero(~invalid) # 無法計算的成績不列入計算, 也不影響成績是否連續的判斷
+            block = df_gradedata.iloc[valid].groupby(['學年', '學期', '學號'], sort=False, dropna=False).ngroup().to_numpy()
+            start = np.flatnonzero(np.r_[True, block[1:] != block[:-1]]) if len(block) else np.zeros(0, dtype=int)
+            checks.append((np.isin(np.arange(len(df_gradedata)), valid[start[pd.Series(block[start]).duplicated().to_numpy()]]), '學號', '學生成績不連續', False))
+            report = pd.concat([pd.DataFrame({'列號':row_number[selected], '學號':student_id.to_numpy(dtype=object)[selected], '欄位':coli,\
+                                              '值':df_gradedata[coli].to_numpy(dtype=object)[selected], '問題':problem, '錯誤':error}, columns=self.report_columns)\
+                                for selected, coli, problem, error in checks], ignore_index=True)
+            report = report.sort_values('列號', kind='stable', ignore_index=True)
+        return report, invalid
+    
+    def check_report(self, report, counts=None):
+        """
+        
+        將檢查結果存為validation_report, 有無法計算的成績且skip_invalid為False時產生ValueError, 訊息中列出每種問題的數量與前幾筆成績
+        
+        ----------
+        Parameters
+        ----------
+        report: pd.DataFrame
+            validate_gradedata的檢查結果
+        counts: dict, str:int
+            每種問題的總數(串流模式的report每種問題只保留前report_limit筆, 預設為report中的數量)
+        errors: pd.DataFrame
+            無法計算的成績
+        n_errors: dict, str:int
+            每種無法計算的問題的總數
+        """
+        self.validation_report = report
+        errors = report[report['錯誤'].astype(bool).to_numpy()]
+        if counts is None:
+            counts = report['問題'].value_counts(sort=False).to_dict()
+        for problem, count in counts.items():
+            if count > ( report['問題'] == problem ).sum():
+                logger.warning('%s: %s共%d筆, validation_report只保留前%d筆', self.grade_path, problem, count, self.report_limit)
+        n_errors = {problem:count for problem, count in counts.items() if problem in set(errors['問題'])}
+        if n_errors and not self.skip_invalid:
+            raise ValueError('成績檔中有%d筆無法計算的成績(%s), 可設定grade_map對應未知的等第成績或設定skip_invalid=True略過這些成績, 清單在validation_report:\n%s'\
+                             % (sum(n_errors.values()), '、'.join('%s %d筆' % item for item in n_errors.items()), errors.head(20).to_string(index=False)))
+    
+    def drop_adjacent_duplicates(self, df_gradedata):
+        """
+        
+        刪除和上一筆成績的學年、學期、學號、課程識別碼與學分都相同的重複成績
+        
+        ----------
+        Parameters
+        ----------
+        df_gradedata: pd.DataFrame
+            成績總表
+        duplicated: pd.Series, boolean
+            該筆成績是否和上一筆重複
+        """
+        duplicated = ( df_gradedata[self.duplicate_columns] == df_gradedata[self.duplicate_columns].shift() ).all(axis=1)
+        return df_gradedata[~duplicated.to_numpy()].reset_index(drop=True)
+    
+    def compact_gradedata(self, df_gradedata):
+        """
+        
+        將integer_columns中全部都是整數(沒有空白、小數或文字)的欄位轉為最小的整數型態,
+        其他欄位維持原本的值與型態; 等第積分維持float64, 使加總的結果與原本完全相同
+        
+        ----------
+        Parameters
+        ----------
+        df_gradedata: pd.DataFrame
+            成績總表
+        """
+        for coli in self.integer_columns:
+            if coli in df_gradedata and pd.api.types.infer_dtype(df_gradedata[coli], skipna=False) == 'integer':
+                df_gradedata[coli] = pd.to_numeric(df_gradedata[coli], downcast='integer')
+        return df_gradedata
+    
+    @property
+    def df_gradedata(self): #學生成績
+        """
+        
+        所有學生所有成績的總表, 成績檔只會解析一次並暫存, 成績檔被修改後才會重新解析
+        
+        ----------
+        Parameters
+        ----------
+        cache: dict
+            已解析的成績總表暫存
+        df_gradedata: pd.DataFrame
+            所有學生的成績總表
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        """
+        cache = self.load_gradedata()
+        return cache['df_gradedata'], cache['sheetname']
+    
+    @property
+    def semester_rows(self):
+        """
+        
+        成績總表依學期分組的列位置(只在第一次使用時建立並暫存), 取代複製各學期的成績表:
+        第i學期的成績為df_gradedata.iloc[order[offsets[i]:offsets[i+1]]], 各學期內維持成績總表中的原始順序
+        
+        ----------
+        Parameters
+        ----------
+        cache: dict
+            已解析的成績總表暫存, 建立好的列位置也會存在其中
+        group: np.array, int
+            每筆成績所屬(學年, 學期)組合的編號(依第一次出現的順序)
+        first: np.array, int
+            每個(學年, 學期)組合第一次出現的列位置
+        semester: np.array, int
+            每筆成績所屬學期在sheetname中的位置
+        order: np.array, int
+            依學期順序排列的列位置
+        offsets: np.array, int
+            每個學期在order中的起始位置(最後一個為成績總筆數)
+        """
+        cache = self.load_gradedata()
+        if cache['semester_rows'] is None:
+            with self.stage('semester_rows') as record:
+                df_gradedata, sheetname = cache['df_gradedata'], cache['sheetname']
+                record['rows'] += len(df_gradedata)
+                group = df_gradedata.groupby(['學年', '學期'], sort=False, dropna=False).ngroup().to_numpy()
+                _, first = np.unique(group, return_index=True)
+                df_first = df_gradedata.iloc[first]
+                semester = pd.Index(sheetname).get_indexer(df_first['學年'].astype(str) + '_' + df_first['學期'].astype(str)).astype(np.int32)[group]
+                order = np.argsort(semester, kind='stable').astype(np.int32)
+                offsets = np.concatenate([[0], np.cumsum(np.bincount(semester, minlength=len(sheetname)))])
+                cache['semester_rows'] = (semester, order, offsets)
+        return cache['semester_rows']
+    
+    @property
+    def df_gradedata_split(self): #學生成績
+        """
+        
+        將df_gradedata中的成績總表分割為不同學期的成績表
+        (每次呼叫都會依semester_rows取出新的成績表, 不會暫存; 程式內部的計算都直接使用semester_rows, 不需要複製成績表)
+        
+        ----------
+        Parameters
+        ----------
+        df_gradedata: pd.DataFrame
+            所有學生的成績總表
+        df_gradedata_split: list, pd.DataFrame
+            不同學期所有學生的成績表
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        """
+        df_gradedata, sheetname = self.df_gradedata
+        _, order, offsets = self.semester_rows
+        with self.stage('df_gradedata_split') as record:
+            record['rows'] += len(df_gradedata)
+            df_gradedata_split = [df_gradedata.iloc[order[offsets[i]:offsets[i + 1]]].reset_index(drop=True) for i in range(len(sheetname))]
+        return df_gradedata_split, sheetname
+    
+    def category_values(self, coli, codes):
+        """
+        
+        將類別欄位的代碼轉回原本的值(代碼-1代表空白, 轉為NaN)
+        
+        ----------
+        Parameters
+        ----------
+        coli: str
+            類別欄位的名稱 eg. 學號
+        codes: np.array, int
+            類別代碼
+        categories: np.array, object
+            該欄所有類別的值, 最後再加上一個NaN給代碼-1使用
+        """
+        categories = self.df_gradedata[0][coli].cat.categories.to_numpy(dtype=object)
+        categories = np.append(categories, np.nan)
+        return categories[codes].tolist()
+    
+    @property
+    def all_students_id_split(self): 
+        """
+        Parameters
+        ----------
+        semester_rows: tuple, np.array
+            成績總表依學期分組的列位置
+        codes: np.array, int
+            依學期順序排列的學號類別代碼
+        all_students_id_split: 2d list, str
+            不同學期所有學生的學號
+        """
+        _, order, offsets = self.semester_rows
+        codes = self.df_gradedata[0]['學號'].cat.codes.to_numpy()[order]
+        all_students_id_split = []
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            all_students_id_split.append(self.category_values('學號', pd.unique(codes[start:end])))
+        return all_students_id_split
+    
+    @property
+    def all_students_id(self): 
+        """
+        Parameters
+        ----------
+        codes: np.array, int
+            依學期順序排列的學號類別代碼
+        first: np.array, int
+            每個學號第一次出現的位置
+        all_students_id: list, str
+            所有學生的學號(依學期順序第一次出現的先後排列)
+        """
+        _, order, _ = self.semester_rows
+        codes = self.df_gradedata[0]['學號'].cat.codes.to_numpy()[order]
+        codes, first = np.unique(codes, return_index=True)
+        all_students_id = self.category_values('學號', codes[np.argsort(first, kind='stable')])
+        return all_students_id
+    
+    def student_gradedata(self, student_id):
+        """
+        
+        利用student_lookup取出一個學生在各學期的成績表
+        
+        ----------
+        Parameters
+        ----------
+        student_id: str
+            學生的學號
+        df_gradedata: pd.DataFrame
+            所有學生的成績總表
+        rows: np.array, int
+            學生所有成績在成績總表中的列位置(依學期順序排列)
+        semester: np.array, int
+            學生每筆成績所屬學期在sheetname中的位置
+        """
+        df_gradedata, sheetname = self.df_gradedata
+        rows, arrays = self.student_lookup
+        rows = rows.get(student_id)
+        if rows is None:
+            return [df_gradedata.iloc[:0]] * len(sheetname)
+        semester = arrays['semester'][rows]
+        return [df_gradedata.iloc[rowsi] for rowsi in np.split(rows, np.searchsorted(semester, np.arange(1, len(sheetname))))]
+    
+    @property
+    def student_lookup(self):
+        """
+        
+        查詢單一學生用的索引(只在第一次使用時建立並暫存): 學號對應到該學生在成績總表中所有成績的列位置(依學期順序與原始順序排列),
+        以及student_report需要的各欄NumPy陣列, 查詢時只需取出該學生的幾列, 不必處理整個成績總表
+        
+        ----------
+        Parameters
+        ----------
+        cache: dict
+            已解析的成績總表暫存, 建立好的索引也會存在其中
+        df_gradedata: pd.DataFrame
+            所有學生的成績總表
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        semester: np.array, int
+            每筆成績所屬學期在sheetname中的位置
+        student: np.array, int
+            每筆成績的學號代碼
+        order: np.array, int
+            依學號、學期與原始順序排列的索引
+        position: np.array, int
+            order中每筆成績在依學期排列的順序中的位置
+        first: np.array, int
+            依第一次出現(依學期順序)的先後排列的學生
+        rows: dict, str:np.array, int
+            學號對應到該學生所有成績的列位置(學號依all_students_id的順序排列)
+        arrays: dict, str:np.array
+            各欄的NumPy陣列(直接使用成績總表的欄位, 不另外複製; 類別欄位為代碼, 對應的值存在arrays['categories'])
+        """
+        cache = self.load_gradedata()
+        if cache['student_lookup'] is None:
+            with self.stage('student_lookup') as record:
+                df_gradedata, sheetname = cache['df_gradedata'], cache['sheetname']
+                record['rows'] += len(df_gradedata)
+                semester, order, _ = self.semester_rows
+                student = df_gradedata['學號'].cat.codes.to_numpy()
+                position = np.argsort(student[order], kind='stable')
+                order = order[position]
+                position, order = position[student[order] >= 0], order[student[order] >= 0] # 略過沒有學號的成績
+                student_id, starts = np.unique(student[order], return_index=True)
+                first = np.argsort(position[starts], kind='stable')
+                rows = np.split(order, starts[1:]) if len(order) else []
+                rows = dict(zip(df_gradedata['學號'].cat.categories[student_id[first]], [rows[i] for i in first]))
+                arrays = {'semester':semester, 'core1':self.core1_matched(df_gradedata), 'group':self.course_labels(df_gradedata['課名']), 'categories':{}}
+                for coli in ['學年', '學期', '等第積分', '學分', '年級', '學生姓名', '學生本學系', '課名', '成績']:
+                    if isinstance(df_gradedata[coli].dtype, pd.CategoricalDtype):
+                        arrays[coli] = df_gradedata[coli].cat.codes.to_numpy()
+                        arrays['categories'][coli] = np.append(df_gradedata[coli].cat.categories.to_numpy(dtype=object), np.nan) # 代碼-1為空白
+                    else:
+                        arrays[coli] = df_gradedata[coli].to_numpy()
+                cache['student_lookup'] = (rows, arrays)
+        return cache['student_lookup']
+    
+    def student_report(self, student_id):
+        """
+        
+        只讀取一個學生的成績, 計算該學生每學期的平均與總學分數、年級、系所、三科平均與修習的三科成績
+        (不會呼叫get_df_alldata, 結果與df_alldata中該學生的資料相同); 找不到學號時會產生KeyError
+        
+        ----------
+        Parameters
+        ----------
+        student_id: str
+            學生的學號
+        rows: np.array, int
+            學生所有成績在成績總表中的列位置(依學期順序排列)
+        semester: np.array, int
+            學生每筆成績所屬學期在sheetname中的位置
+        graded: np.array, boolean
+            該筆成績是否有等第成績
+        gradesum: np.array, float
+            學生每學期與三科(最後一個)的等第積分乘上學分數的總和
+        creditsum: np.array, float
+            學生每學期與三科(最後一個)的總學分數
+        avg: list, float
+            學生每學期所有科目與三科(最後一個)的平均分數
+        trendavg: list, tuple
+            學生每學期的累計平均與近幾學期平均(有開啟時)
+        core1: np.array, int
+            學生的三科成績依學年(新到舊)、學期(新到舊)與原始順序排列後的列位置, 重複修習相同課名時只留下最新的一筆
+        groupgrade: 2d np.array, float
+            學生每組與合併(最後一個)的等第積分乘上學分數的總和
+        groupcredit: 2d np.array, float
+            學生每組與合併(最後一個)的總學分數
+        value: function
+            取出某欄第i列的值(類別欄位由代碼轉回原本的值, 數值欄位轉為python的數值)
+        report: dict
+            學生的學號、姓名、系所、年級、每學期平均與總學分數(以及有開啟時的累計平均與近幾學期平均)、三科平均、各組平均(只有一組時為空)與三科成績("等第成績 等第積分 學分數")
+        """
+        with self.stage('student_report'):
+            rows, arrays = self.student_lookup
+            sheetname = self.load_gradedata()['sheetname']
+            rows = rows[student_id]
+            semester = arrays['semester'][rows]
+            grade = arrays['等第積分'][rows]
+            credit = arrays['學分'][rows].astype(float)
+            graded = ~np.isnan(grade)
+            gradesum = np.zeros(len(sheetname) + 1) # 最後一個為三科
+            creditsum = np.zeros(len(sheetname) + 1)
+            for i in np.unique(semester[graded]):
+                selected = graded & ( semester == i )
+                gradesum[i], creditsum[i] = np.sum(grade[selected] * credit[selected]), np.sum(credit[selected])
+            core1 = rows[arrays['core1'][rows]]
+            core1 = core1[np.lexsort((core1, -arrays['學期'][core1].astype(float), -arrays['學年'][core1].astype(float)))]
+            value = lambda coli, i: arrays['categories'][coli][arrays[coli][i]] if coli in arrays['categories'] else arrays[coli][i:i + 1].tolist()[0]
+            seen = set()
+            core1 = [i for i in core1 if not ( arrays['課名'][i] in seen or seen.add(arrays['課名'][i]) )] # 重複修習相同課名時只留下最新的一筆
+            core1 = np.array(core1, dtype=np.intp)
+            groupgrade, groupcredit = self.group_sums(np.zeros(len(core1), dtype=np.intp), arrays['group'][core1], arrays['等第積分'][core1], arrays['學分'][core1].astype(float), 1)
+            gradesum[-1], creditsum[-1] = groupgrade[0, -1], groupcredit[0, -1]
+            group_columns = self.group_columns
+            avg = self.calc_avg(gradesum, creditsum).tolist()
+            trendavg = self.calc_trendavg(gradesum[:-1], creditsum[:-1], sheetname)
+            department = [value('學生本學系', i) for i in rows]
+            department = [departmenti for departmenti in department if departmenti == departmenti]
+            report = {
+                '學號':student_id,
+                '學生姓名':value('學生姓名', rows[0]),
+                '學生本學系':department[0] if department else np.nan,
+                '年級':value('年級', rows[0]),
+                '所有科目平均':dict(zip(sheetname, avg)),
+                '總學分數':dict(zip(sheetname, creditsum.tolist())),
+                **{suffix.strip():dict(zip(sheetname, trendavgi[0].tolist())) for suffix, trendavgi in trendavg},
+                '三科平均':avg[-1],
+                '各組平均':dict(zip(group_columns, self.calc_avg(groupgrade[0, :-1], groupcredit[0, :-1]).tolist())) if group_columns else {},
+                '三科成績':{value('課名', i):str(value('成績', i)) + ' ' + str(value('等第積分', i)) + ' ' + str(value('學分', i)).strip() for i in core1},
+                }
+        return report
+    
+    def students_first_data(self, col, df_gradedata_split=None, skipna=False):
+        """
+        
+        取得每個學生第一筆成績(依學期順序)中某個欄位的值, 學生的順序與all_students_id相同
+        
+        ----------
+        Parameters
+        ----------
+        col: str
+            欄位名稱 eg. 年級
+        df_gradedata_split: list, pd.DataFrame
+            要搜尋的成績表, 預設為不同學期所有學生的成績表
+        skipna: boolean
+            是否跳過空白的值, 改取該學生第一個不是空白的值
+        df_gradedata: pd.DataFrame
+            依學期順序合併的成績表
+        order: np.array, int
+            依學期順序排列的列位置(未指定df_gradedata_split時直接由成績總表取值, 不需合併各學期的成績表)
+        codes: np.array, int
+            每個學生的學號類別代碼
+        first: np.array, int
+            每個學生第一筆資料在order中的位置
+        first_data: pd.Series
+            每個學生的第一筆資料, index為學號
+        """
+        if df_gradedata_split is None:
+            df_gradedata = self.df_gradedata[0]
+            _, order, _ = self.semester_rows
+            if skipna:
+                order = order[df_gradedata[col].notna().to_numpy()[order]]
+            codes, first = np.unique(df_gradedata['學號'].cat.codes.to_numpy()[order], return_index=True)
+            return pd.Series(df_gradedata[col].iloc[order[first]].to_numpy(), index=self.category_values('學號', codes), name=col)
+        df_gradedata = pd.concat(df_gradedata_split, ignore_index=True)[['學號', col]]
+        if skipna:
+            df_gradedata = df_gradedata[df_gradedata[col].notna().to_numpy()]
+        df_gradedata = df_gradedata.astype({'學號':object})
+        first_data = df_gradedata.drop_duplicates('學號').set_index('學號')[col]
+        if hasattr(first_data, 'cat'):
+            first_data = first_data.astype(object)
+        return first_data
+    
+    @property
+    def all_students_name_split(self):
+        """
+        Parameters
+        ----------
+        df_gradedata_split: list, pd.DataFrame
+            不同學期所有學生的成績表
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        all_students_id_split: 2d list, str
+            不同學期所有學生的學號
+        all_students_name_split: 2d list, str
+            不同學期所有學生的姓名
+        """
+        df_gradedata_split, sheetname = self.df_gradedata_split
+        all_students_id_split = self.all_students_id_split
+        all_students_name_split = []
+        for df_gradedata_spliti, all_students_idi in zip(df_gradedata_split, all_students_id_split):
+            all_students_name_split.append(self.students_first_data('學生姓名', [df_gradedata_spliti]).reindex(all_students_idi).tolist())
+        return all_students_name_split
+    
+    @property
+    def all_students_name(self):
+        """
+        Parameters
+        ----------
+        all_students_id: list, str
+            所有學生的學號
+        all_students_name: list, str
+            所有學生的姓名
+        """
+        all_students_id = self.all_students_id
+        all_students_name = self.students_first_data('學生姓名').reindex(all_students_id).tolist()
+        return all_students_name
+    
+    @property
+    def all_students_year_split(self):
+        """
+        Parameters
+        ----------
+        df_gradedata_split: list, pd.DataFrame
+            不同學期所有學生的成績表
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        all_students_id_split: 2d list, str
+            不同學期所有學生的學號
+        all_students_year_split: 2d list, str
+            不同學期所有學生的年級
+        """
+        df_gradedata_split, sheetname = self.df_gradedata_split
+        all_students_id_split = self.all_students_id_split
+        all_students_year_split = []
+        for df_gradedata_spliti, all_students_idi in zip(df_gradedata_split, all_students_id_split):
+            all_students_year_split.append(self.students_first_data('年級', [df_gradedata_spliti]).reindex(all_students_idi).tolist())
+        return all_students_year_split
+    
+    @property
+    def all_students_year(self):
+        """
+        Parameters
+        ----------
+        all_students_id: list, str
+            所有學生的學號
+        all_students_year: list, str
+            所有學生的年級
+        """
+        all_students_id = self.all_students_id
+        all_students_year = self.students_first_data('年級').reindex(all_students_id).tolist()
+        return all_students_year
+    
+    @property
+    def all_students_department_split(self):
+        """
+        Parameters
+        ----------
+        df_gradedata_split: list, pd.DataFrame
+            不同學期所有學生的成績表
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        all_students_id_split: 2d list, str
+            不同學期所有學生的學號
+        all_students_department_split: 2d list, str
+            不同學期所有學生的系所名稱
+        """
+        df_gradedata_split, sheetname = self.df_gradedata_split
+        all_students_id_split = self.all_students_id_split
+        all_students_department_split = []
+        for df_gradedata_spliti, all_students_idi in zip(df_gradedata_split, all_students_id_split):
+            all_students_department_split.append(self.students_first_data('學生本學系', [df_gradedata_spliti]).reindex(all_students_idi).tolist())
+        return all_students_department_split
+    
+    @property
+    def all_students_department(self):
+        """
+        Parameters
+        ----------
+        all_students_id: list, str
+            所有學生的學號
+        all_students_department: list, str
+            所有學生的系所名稱(取該學生第一筆不是空白的系所名稱)
+        """
+        all_students_id = self.all_students_id
+        all_students_department = self.students_first_data('學生本學系', skipna=True).reindex(all_students_id).tolist()
+        return all_students_department
+    
+    def calc_avg(self, gradesum, creditsum):
+        """
+        
+        由等第積分乘上學分數的總和與總學分數計算平均並四捨五入(總學分數為0時平均為0)
+        
+        ----------
+        Parameters
+        ----------
+        gradesum: np.array, float
+            等第積分乘上學分數的總和
+        creditsum: np.array, float
+            總學分數
+        avg: np.array, float
+            四捨五入後的平均分數
+        """
+        gradesum = np.asarray(gradesum, dtype=float)
+        creditsum = np.asarray(creditsum, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            avg = np.where(creditsum != 0, gradesum / creditsum, 0)
+        avg = self.modify_round_array(avg)
+        return avg
+    
+    def calc_allavg(self, student_id, full_output=False):
+        """
+        
+        計算一個學生每個學期所有科目的總平均
+        
+        ----------
+        Parameters
+        ----------
+        student_id: str
+            學生的學號
+        full_output: boolean
+            是否需要輸出學生的總學分數
+        df_student_split: list, pd.DataFrame
+            學生在不同學期的成績表
+        allcredits: np.array, int
+            不同學期學生的總學分數
+        allavgs: np.array, float
+            不同學期學生所有科目的平均分數
+        allcredit: np.array, int
+            學生的總學分數
+        allavg: np.array, float
+            學生所有科目的平均分數
+        grade: np.array, float
+            學生各科的成績(等第積分)
+        credit: np.array, float
+            學生各科的學分數
+        selected: np.array, boolean
+            該筆成績是否有等第成績
+        """
+        with self.stage('calc_allavg') as record:
+            df_student_split = self.student_gradedata(student_id)
+            allcredits = np.array([])
+            allavgs = np.array([])
+            for df_student_spliti in df_student_split:
+                record['rows'] += len(df_student_spliti)
+                selected = df_student_spliti['等第積分'].notna().to_numpy()
+                grade = df_student_spliti['等第積分'].to_numpy()[selected]
+                credit = df_student_spliti['學分'].to_numpy(dtype=float)[selected]
+                allcredit = sum(credit)
+                allavg = np.sum( grade * credit ) / allcredit if ( grade.size != 0 ) and ( allcredit != 0 ) else 0
+                allavg = self.modify_round(allavg)
+                allcredits = np.append(allcredits, allcredit)
+                allavgs = np.append(allavgs, allavg)
+        if full_output:
+            return allavgs, allcredits
+        else:
+            return allavgs
+    
+    def calc_allavg_all(self, full_output=False, trend_output=False):
+        """
+        
+        一次計算所有學生每個學期所有科目的總平均(結果與對每個學生呼叫calc_allavg相同)
+        
+        ----------
+        Parameters
+        ----------
+        full_output: boolean
+            是否需要輸出所有學生的總學分數
+        trend_output: boolean
+            是否另外輸出calc_trendavg算出的累計平均與近幾學期平均(開啟時一併輸出總學分數)
+        df_gradedata: pd.DataFrame
+            所有學生的成績總表
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        all_students_id: list, str
+            所有學生的學號
+        graded: np.array, boolean
+            該筆成績是否有等第成績
+        student: np.array, int
+            每筆成績所屬學生在all_students_id中的位置
+        semester: np.array, int
+            每筆成績所屬學期在sheetname中的位置
+        grade: np.array, float
+            每筆成績的等第積分
+        credit: np.array, float
+            每筆成績的學分數
+        allgrades: 2d np.array, float
+            所有學生不同學期的等第積分乘上學分數的總和(列為學生, 行為學期)
+        allcredits: 2d np.array, float
+            所有學生不同學期的總學分數(列為學生, 行為學期)
+        allavgs: 2d np.array, float
+            所有學生不同學期所有科目的平均分數(列為學生, 行為學期)
+        df_allavg: pd.DataFrame
+            所有學生不同學期所有科目的平均分數表, index為學號, 欄位為學期名稱
+        df_allcredit: pd.DataFrame
+            所有學生不同學期的總學分數表, index為學號, 欄位為學期名稱
+        """
+        with self.stage('calc_allavg_all') as record:
+            df_gradedata, sheetname = self.df_gradedata
+            semester, _, _ = self.semester_rows
+            all_students_id = self.all_students_id
+            record['rows'] += len(df_gradedata)
+            student = pd.Index(all_students_id).get_indexer(self.category_values('學號', np.arange(-1, len(df_gradedata['學號'].cat.categories))))
+            student = student[df_gradedata['學號'].cat.codes.to_numpy() + 1] # 由學號代碼對應到all_students_id中的位置(代碼-1為空白學號)
+            graded = df_gradedata['等第積分'].notna().to_numpy() # 只取有等第成績的資料
+            student, semester = student[graded], semester[graded]
+            grade = df_gradedata['等第積分'].to_numpy()[graded]
+            credit = df_gradedata['學分'].to_numpy(dtype=float)[graded]
+            if ( self.workers or 1 ) > 1:
+                from ntuche_tmdm_parallel import parallel_semester_sums # 只有開啟多行程時才載入multiprocessing
+                allgrades, allcredits = parallel_semester_sums(student, semester, grade, credit, len(all_students_id), len(sheetname), self.workers)
+            else:
+                allgrades, allcredits = self.semester_sums(student, semester, grade, credit, len(all_students_id), len(sheetname))
+            allavgs = self.calc_avg(allgrades, allcredits)
+            df_allavg = pd.DataFrame(allavgs, index=all_students_id, columns=sheetname)
+            df_allcredit = pd.DataFrame(allcredits, index=all_students_id, columns=sheetname)
+        if trend_output:
+            return df_allavg, df_allcredit, self.calc_trendavg(allgrades, allcredits, sheetname)
+        if full_output:
+            return df_allavg, df_allcredit
+        else:
+            return df_allavg
+    
+    @staticmethod
+    def semester_sums(student, semester, grade, credit, n_students, n_semesters):
+        """
+        
+        依(學生, 學期)分組加總等第積分乘上學分數與學分數, 同一組內依照成績原本的順序加總
+        
+        ----------
+        Parameters
+        ----------
+        student: np.array, int
+            每筆成績所屬學生的位置
+        semester: np.array, int
+            每筆成績所屬學期在sheetname中的位置
+        grade: np.array, float
+            每筆成績的等第積分
+        credit: np.array, float
+            每筆成績的學分數
+        n_students: int
+            學生人數
+        n_semesters: int
+            學期數
+        key: np.array, int
+            學期與學生合併後的分組代號, 同一個學生同一個學期的成績有相同的代號
+        allgrades: 2d np.array, float
+            不同學期的等第積分乘上學分數的總和(列為學生, 行為學期)
+        allcredits: 2d np.array, float
+            不同學期的總學分數(列為學生, 行為學期)
+        """
+        key = np.asarray(semester, dtype=np.intp) * n_students + np.asarray(student, dtype=np.intp)
+        order = np.argsort(key, kind='stable') # 同一組內維持原本的順序
+        key, starts, lengths = np.unique(key[order], return_index=True, return_counts=True)
+        gradesum = arrangement.segment_sum((grade * credit)[order], starts, lengths)
+        creditsum = arrangement.segment_sum(credit[order], starts, lengths)
+        allgrades = np.zeros((n_students, n_semesters))
+        allcredits = np.zeros((n_students, n_semesters))
+        allgrades[key % n_students, key // n_students] = gradesum
+        allcredits[key % n_students, key // n_students] = creditsum
+        return allgrades, allcredits
+    
+    @property
+    def semester_suffixes(self):
+        """
+        
+        df_alldata中每學期的欄位名稱(學期名稱之後的部分), 依序為所有科目平均、總學分數以及有開啟時的累計平均與近幾學期平均
+        
+        ----------
+        Parameters
+        ----------
+        suffixes: list, str
+            每學期的欄位名稱 eg. [' 所有科目平均', ' 總學分數', ' 累計平均', ' 近2學期平均']
+        """
+        suffixes = [' 所有科目平均', ' 總學分數']
+        if self.cumulative_gpa:
+            suffixes.append(' 累計平均')
+        if self.rolling_gpa:
+            suffixes.append(' 近%d學期平均' % self.rolling_gpa)
+        return suffixes
+    
+    def calc_trendavg(self, allgrades, allcredits, sheetname):
+        """
+        
+        由學生×學期的等第積分乘上學分數總和與總學分數, 計算每學期的累計平均與近rolling_gpa個學期的平均(依學年、學期由舊到新),
+        累計平均以np.cumsum一次算出所有學期的前綴和; 近幾學期平均則將前幾個學期的總和依序由舊到新相加(不以前綴和相減, 避免浮點數的誤差),
+        四捨五入的方式與每學期平均相同, 計算量只和學生人數×學期數有關
+        
+        ----------
+        Parameters
+        ----------
+        allgrades: 2d np.array, float
+            所有學生不同學期的等第積分乘上學分數的總和(列為學生, 行為學期, 學期依sheetname的順序)
+        allcredits: 2d np.array, float
+            所有學生不同學期的總學分數
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        order: np.array, int
+            依學年、學期由舊到新排列的學期位置
+        grades: 2d np.array, float
+            依學期由舊到新排列的等第積分乘上學分數的總和
+        credits: 2d np.array, float
+            依學期由舊到新排列的總學分數
+        rollgrades: 2d np.array, float
+            最近幾個學期的等第積分乘上學分數的總和
+        rollcredits: 2d np.array, float
+            最近幾個學期的總學分數
+        trendavg: list, tuple
+            (欄位名稱, 所有學生每學期的平均), 學期依sheetname的順序
+        """
+        allgrades = np.asarray(allgrades, dtype=float).reshape(-1, len(sheetname))
+        allcredits = np.asarray(allcredits, dtype=float).reshape(-1, len(sheetname))
+        order = np.array(sorted(range(len(sheetname)), key=lambda i: tuple(float(value) for value in sheetname[i].split('_'))), dtype=np.intp)
+        grades, credits = allgrades[:, order], allcredits[:, order]
+        trendavg = []
+        if self.cumulative_gpa:
+            trendavg.append((' 累計平均', self.calc_avg(np.cumsum(grades, axis=1), np.cumsum(credits, axis=1))))
+        if self.rolling_gpa:
+            rollgrades, rollcredits = np.zeros_like(grades), np.zeros_like(credits)
+            for lag in range(min(self.rolling_gpa, len(sheetname)) - 1, -1, -1):
+                rollgrades[:, lag:] += grades[:, :len(sheetname) - lag]
+                rollcredits[:, lag:] += credits[:, :len(sheetname) - lag]
+            trendavg.append((' 近%d學期平均' % self.rolling_gpa, self.calc_avg(rollgrades, rollcredits)))
+        return [(suffix, avg[:, np.argsort(order)]) for suffix, avg in trendavg]
+    
+    @property
+    def course_rules(self):
+        """
+        
+        將course_groups編譯成比對課名用的規則(每組的include與exclude各合併為一個正規表示式), 未設定course_groups時由core_course1產生預設的一組
+        
+        ----------
+        Parameters
+        ----------
+        course_groups: list, dict
+            課程分組規則
+        course_rules: list, dict
+            每組的名稱、include與exclude的正規表示式、權重與學分上限(沒有上限為inf)
+        """
+        course_groups = self.course_groups
+        if course_groups is None:
+            course_groups = [{'name':'三科', 'include':self.core_course1, 'exclude':['實驗']}]
+        course_rules = []
+        for groupi in course_groups:
+            if not groupi.get('include'):
+                raise ValueError('課程分組%r沒有設定include' % groupi.get('name'))
+            course_rules.append({
+                'name':str(groupi['name']),
+                'include':re.compile('|'.join(map(re.escape, groupi['include']))),
+                'exclude':re.compile('|'.join(map(re.escape, groupi['exclude']))) if groupi.get('exclude') else None,
+                'weight':float(groupi.get('weight', 1)),
+                'credit_cap':float('inf') if groupi.get('credit_cap') is None else float(groupi['credit_cap']),
+                })
+        return course_rules
+    
+    @property
+    def group_columns(self):
+        """
+        
+        df_alldata中每組平均的欄位名稱(組名+平均), 只有一組時該組的平均就是三科平均, 不另外加欄位
+        """
+        course_rules = self.course_rules
+        return [rule['name'] + '平均' for rule in course_rules] if len(course_rules) > 1 else []
+    
+    @staticmethod
+    def course_group(course_name, course_rules):
+        """
+        
+        回傳課名所屬的組在course_rules中的位置, 不屬於任何一組(或課名空白)時回傳-1
+        
+        ----------
+        Parameters
+        ----------
+        course_name: str
+            課名
+        course_rules: list, dict
+            由course_rules編譯好的規則
+        """
+        if not isinstance(course_name, str):
+            return -1
+        for i, rule in enumerate(course_rules):
+            if rule['include'].search(course_name) and not ( rule['exclude'] and rule['exclude'].search(course_name) ):
+                return i
+        return -1
+    
+    def course_labels(self, course_name):
+        """
+        
+        一次標記每筆成績的課程所屬的組: 每個不同的課名只比對一次, 再依類別代碼對應回每一筆成績
+        
+        ----------
+        Parameters
+        ----------
+        course_name: pd.Series
+            每筆成績的課名
+        codes: np.array, int
+            每筆成績的課名代碼(空白為-1)
+        categories: pd.Index
+            所有不同的課名
+        labels: np.array, int
+            每個課名所屬的組, 最後一個-1給空白的課名使用
+        """
+        if isinstance(course_name.dtype, pd.CategoricalDtype):
+            codes, categories = course_name.cat.codes.to_numpy(), course_name.cat.categories
+        else:
+            codes, categories = pd.factorize(course_name)
+        course_rules = self.course_rules
+        labels = np.array([self.course_group(cne, course_rules) for cne in categories] + [-1], dtype=np.int16)
+        return labels[codes]
+    
+    def group_sums(self, student, group, grade, credit, n_students):
+        """
+        
+        加總每個學生每組的等第積分乘上學分數與學分數, 並依各組權重合併
+        (成績需依學生與新到舊排列, 有學分上限的組從最新的成績開始採計, 超過上限的部分不採計)
+        
+        ----------
+        Parameters
+        ----------
+        student: np.array, int
+            每筆成績所屬學生的位置
+        group: np.array, int
+            每筆成績所屬的組
+        grade: np.array, float
+            每筆成績的等第積分
+        credit: np.array, float
+            每筆成績的學分數
+        n_students: int
+            學生人數
+        key: np.array, int
+            每筆成績的(學生, 組)編號
+        cap: np.array, float
+            每組的學分上限
+        before: np.array, float
+            同一個學生同一組中比該筆成績新的成績的學分數總和
+        groupgrade: 2d np.array, float
+            每個學生每組(最後一行為合併)的等第積分乘上學分數的總和
+        groupcredit: 2d np.array, float
+            每個學生每組(最後一行為合併)的總學分數
+        """
+        course_rules = self.course_rules
+        n_groups = len(course_rules)
+        key = np.asarray(student, dtype=np.intp) * n_groups + np.asarray(group, dtype=np.intp)
+        order = np.argsort(key, kind='stable')
+        key, grade, credit = key[order], np.asarray(grade, dtype=float)[order], np.asarray(credit, dtype=float)[order]
+        keys, starts, lengths = np.unique(key, return_index=True, return_counts=True)
+        cap = np.array([rule['credit_cap'] for rule in course_rules])
+        if np.isfinite(cap).any():
+            before = np.cumsum(credit) - credit
+            before = before - np.repeat(before[starts], lengths)
+            credit = np.clip(np.minimum(credit, cap[key % n_groups] - before), 0, None)
+        groupgrade = np.zeros((n_students, n_groups + 1))
+        groupcredit = np.zeros((n_students, n_groups + 1))
+        groupgrade[keys // n_groups, keys % n_groups] = self.segment_sum(grade * credit, starts, lengths)
+        groupcredit[keys // n_groups, keys % n_groups] = self.segment_sum(credit, starts, lengths)
+        weight = np.array([rule['weight'] for rule in course_rules])
+        groupgrade[:, -1] = ( groupgrade[:, :-1] * weight ).sum(axis=1)
+        groupcredit[:, -1] = ( groupcredit[:, :-1] * weight ).sum(axis=1)
+        return groupgrade, groupcredit
+    
+    def core1_gradedata(self, df_gradedata):
+        """
+        
+        從成績表中挑出有等第成績的微積分、普通物理學與普通化學成績(課名含有共通字串且不是實驗課),
+        並依學號、學年(新到舊)、學期(新到舊)與原始順序排序, 若重複修習相同課名, 只留下最新的一筆
+        
+        ----------
+        Parameters
+        ----------
+        df_gradedata: pd.DataFrame
+            學生的成績表
+        order: np.array, int
+            排序後的索引
+        df_core1: pd.DataFrame
+            三科成績表
+        """
+        df_core1 = df_gradedata[self.core1_matched(df_gradedata)]
+        order = np.lexsort((np.arange(len(df_core1)), -df_core1['學期'].to_numpy(dtype=float), -df_core1['學年'].to_numpy(dtype=float), df_core1['學號'].cat.codes.to_numpy()))
+        df_core1 = df_core1.iloc[order]
+        df_core1 = df_core1[~df_core1.duplicated(['學號', '課名']).to_numpy()]
+        return df_core1
+    
+    def core1_matched(self, df_gradedata):
+        """
+        
+        判斷每筆成績是否為有等第成績的微積分、普通物理學與普通化學成績(預設為課名含有共通字串且不是實驗課, 可由course_groups設定)
+        
+        ----------
+        Parameters
+        ----------
+        df_gradedata: pd.DataFrame
+            學生的成績表
+        matched: np.array, boolean
+            該筆成績是否為三科成績(有等第成績且屬於course_rules中的某一組)
+        """
+        matched = df_gradedata['等第積分'].notna().to_numpy() & ( self.course_labels(df_gradedata['課名']) >= 0 )
+        return matched
+    
+    @staticmethod
+    def core1_gdcddata(df_core1):
+        """
+        
+        將三科成績轉為"等第成績 等第積分 學分數"的字串
+        
+        ----------
+        Parameters
+        ----------
+        df_core1: pd.DataFrame
+            三科成績表
+        """
+        return df_core1['成績'].astype(str) + ' ' + df_core1['等第積分'].astype(str) + ' ' + df_core1['學分'].astype(str).str.strip()
+    
+    def calc_core1avg(self, student_id, full_output=False):
+        """
+        
+        計算一個學生的微積分、普通物理學與普通化學的三科平均
+        
+        ----------
+        Parameters
+        ----------
+        student_id: str
+            學生的學號
+        full_output: boolean
+            是否需要輸出學生的各個必修課目的課程名稱、等第成績、等第積分與學分數資料
+        df_core1: pd.DataFrame
+            學生修習的微積分、普通化學或普通物理學成績(重複修習相同課名時只留下最新的一筆)
+        core_course1_name: list, str
+            學生修習的微積分、普通化學或普通物理學課名
+        core1grade: 2d np.array, float
+            學生每組與合併(最後一個)的等第積分乘上學分數的總和
+        core1credit: 2d np.array, float
+            學生每組與合併(最後一個)的總學分數
+        gdcddata: list, str
+            學生修習的微積分、普通化學或普通物理學的"等第成績 等第積分 學分數"
+        core1avg: float
+            學生修習的微積分、普通化學或普通物理學的平均分數
+        fulldata: dict, tuple, str
+            包含學生修習的微積分、普通化學或普通物理學的課程名稱、等第成績、等第積分與學分數, 等第成績代表A+, A, A-, ...等
+        """
+        with self.stage('calc_core1avg') as record:
+            df_student = pd.concat(self.student_gradedata(student_id))
+            record['rows'] += len(df_student)
+            df_core1, _, core1grade, core1credit = self.core1_sums(self.core1_gradedata(df_student), [student_id])
+            core_course1_name = df_core1['課名'].tolist()
+            gdcddata = self.core1_gdcddata(df_core1).tolist()
+            core1avg = float(self.calc_avg(core1grade[0, -1], core1credit[0, -1]))
+        if full_output:
+            fulldata = dict(zip(core_course1_name, gdcddata))
+            return core1avg, fulldata
+        else:
+            return core1avg
+    
+    def calc_core1avg_all(self, full_output=False):
+        """
+        
+        一次計算所有學生的微積分、普通物理學與普通化學的三科平均(結果與對每個學生呼叫calc_core1avg相同)
+        
+        ----------
+        Parameters
+        ----------
+        full_output: boolean
+            是否需要輸出所有學生修習的各個必修課目的課程名稱、等第成績、等第積分與學分數資料
+        df_groupavg: pd.DataFrame
+            所有學生每組的平均與三科平均
+        df_corse1data: pd.DataFrame
+            所有學生修習的微積分、普通化學與普通物理學課程的"等第成績 等第積分 學分數"總表
+        """
+        df_groupavg, df_corse1data = self.calc_groupavg_all(True)
+        if full_output:
+            return df_groupavg['三科平均'], df_corse1data
+        else:
+            return df_groupavg['三科平均']
+    
+    def calc_groupavg_all(self, full_output=False):
+        """
+        
+        一次計算所有學生course_rules中每組的平均與合併後的三科平均(依各組權重合併)
+        
+        ----------
+        Parameters
+        ----------
+        full_output: boolean
+            是否需要輸出所有學生修習的各個必修課目的課程名稱、等第成績、等第積分與學分數資料
+        df_gradedata: pd.DataFrame
+            所有學生的成績總表
+        all_students_id: list, str
+            所有學生的學號
+        df_core1: pd.DataFrame
+            所有學生修習的三科成績(重複修習相同課名時只留下最新的一筆), 依照all_students_id的順序排列後存入暫存供update_gradedata使用
+        student: np.array, int
+            每筆三科成績所屬學生在all_students_id中的位置
+        core1grade: 2d np.array, float
+            所有學生每組與合併(最後一行)的等第積分乘上學分數的總和
+        core1credit: 2d np.array, float
+            所有學生每組與合併(最後一行)的總學分數
+        columns: list, str
+            每組平均的欄位名稱(只有一組時沒有)與三科平均
+        df_groupavg: pd.DataFrame
+            所有學生每組的平均與三科平均, index為學號
+        df_corse1data: pd.DataFrame
+            所有學生修習的三科課程的"等第成績 等第積分 學分數"總表
+        """
+        with self.stage('calc_groupavg_all') as record:
+            cache = self.load_gradedata()
+            df_gradedata = cache['df_gradedata']
+            all_students_id = self.all_students_id
+            record['rows'] += len(df_gradedata)
+            df_core1, student, core1grade, core1credit = self.core1_sums(self.core1_gradedata(df_gradedata), all_students_id)
+            cache['df_core1'] = df_core1
+            columns = self.group_columns + ['三科平均']
+            df_groupavg = pd.DataFrame(self.calc_avg(core1grade, core1credit)[:, -len(columns):], index=all_students_id, columns=columns, dtype=float)
+            if full_output:
+                df_corse1data = self.core1_table(df_core1, student, len(all_students_id))
+                return df_groupavg, df_corse1data
+            else:
+                return df_groupavg
+    
+    def core1_sums(self, df_core1, all_students_id):
+        """
+        
+        將三科成績表依照all_students_id的順序排列, 並加總每個學生每組與合併的等第積分乘上學分數與學分數
+        
+        ----------
+        Parameters
+        ----------
+        df_core1: pd.DataFrame
+            由core1_gradedata挑出的三科成績表
+        all_students_id: list, str
+            學生的學號, 決定排列順序與輸出的位置
+        student: np.array, int
+            排列後每筆三科成績所屬學生在all_students_id中的位置
+        core1grade: 2d np.array, float
+            每個學生每組(最後一行為合併)的等第積分乘上學分數的總和
+        core1credit: 2d np.array, float
+            每個學生每組(最後一行為合併)的總學分數
+        """
+        student = pd.Index(all_students_id).get_indexer(df_core1['學號'])
+        order = np.argsort(student, kind='stable') # 依照all_students_id的順序排列學生
+        df_core1, student = df_core1.iloc[order], student[order]
+        core1grade, core1credit = self.group_sums(student, self.course_labels(df_core1['課名']), df_core1['等第積分'].to_numpy(dtype=float),\
+                                                  df_core1['學分'].to_numpy(dtype=float), len(all_students_id))
+        return df_core1, student, core1grade, core1credit
+    
+    def core1_table(self, df_core1, student, n_students, core_course1_name=None):
+        """
+        
+        將排列好的三科成績轉為每個學生一列、每個課名一欄的"等第成績 等第積分 學分數"總表
+        
+        ----------
+        Parameters
+        ----------
+        df_core1: pd.DataFrame
+            由core1_sums排列好的三科成績表
+        student: np.array, int
+            每筆三科成績所屬學生的位置
+        n_students: int
+            學生人數
+        core_course1_name: list, str
+            總表的欄位(課名), 預設為依照排列順序第一次出現的課名
+        gdcddata: pd.Series, str
+            每筆三科成績的"等第成績 等第積分 學分數"
+        data: 2d np.array, object
+            總表的資料
+        """
+        gdcddata = self.core1_gdcddata(df_core1)
+        if core_course1_name is None:
+            core_course1_name = df_core1['課名'].astype(object).unique()
+        data = np.full((n_students, len(core_course1_name)), np.nan, dtype=object)
+        data[student, pd.Index(core_course1_name).get_indexer(df_core1['課名'])] = gdcddata.to_numpy(dtype=object)
+        return pd.DataFrame(data, columns=core_course1_name)
+    
+    def get_df_alldata(self):
+        """
+        
+        獲得所有學生的所有平均分數以及修習的三科資料總表
+        
+        ----------
+        Parameters
+        ----------
+        all_students_id: list, str
+            所有學生的學號
+        all_students_name: list, str
+            所有學生的姓名
+        all_students_department: list, str
+            所有學生的系所名稱
+        all_students_year: list, str
+            所有學生的年級
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        df_allavg: pd.DataFrame
+            所有學生每學期的全科目平均分數表(由calc_allavg_all一次算出)
+        df_allcredit: pd.DataFrame
+            所有學生每學期的總學分數表(由calc_allavg_all一次算出)
+        trendavg: list, tuple
+            所有學生每學期的累計平均與近幾學期平均(由calc_allavg_all一次算出, 沒有開啟時為空)
+        all_allavg: 2d np.array, float
+            所有學生每學期的的全科目平均分數
+        all_allcredit: 2d np.array, float
+            所有學生每學期的的總學分數
+        df_groupavg: pd.DataFrame
+            所有學生每組的平均與三科平均(由calc_groupavg_all一次算出)
+        df_corse1data: pd.DataFrame
+            所有學生修習的微積分、普通化學與普通物理學課程的等第成績、等第積分與學分數總表(由calc_groupavg_all一次算出)
+        df_alldata: pd.DataFrame
+            所有學生的所有平均分數以及修習的三科資料總表
+        """
+        with self.stage('get_df_alldata') as record:
+            with self.stage('students_info'):
+                all_students_id = self.all_students_id
+                all_students_name = self.all_students_name
+                all_students_department = self.all_students_department
+                all_students_year = self.all_students_year
+            sheetname = self.df_gradedata[1]
+            df_allavg, df_allcredit, trendavg = self.calc_allavg_all(True, True)
+            df_groupavg, df_corse1data = self.calc_groupavg_all(True)
+            with self.stage('make_df_alldata'):
+                df_alldata = self.make_df_alldata(all_students_id, all_students_name, all_students_department, all_students_year, sheetname,\
+                                                  df_allavg.to_numpy(), df_allcredit.to_numpy(), df_groupavg['三科平均'].to_numpy(), df_corse1data,\
+                                                  df_groupavg.iloc[:, :-1].to_numpy(), self.group_columns, trendavg)
+            record['rows'] += len(df_alldata)
+            self.__df_alldata = df_alldata
+        return df_alldata
+    
+    @staticmethod
+    def make_df_alldata(all_students_id, all_students_name, all_students_department, all_students_year, sheetname,\
+                        all_allavg, all_allcredit, all_core1avg, df_corse1data, all_groupavg=None, group_columns=(), trendavg=()):
+        """
+        
+        將所有學生的基本資料、每學期平均與總學分數、三科平均與三科成績合併成df_alldata總表
+        
+        ----------
+        Parameters
+        ----------
+        all_students_id: list, str
+            所有學生的學號
+        all_students_name: list, str
+            所有學生的姓名
+        all_students_department: list, str
+            所有學生的系所名稱
+        all_students_year: list, str
+            所有學生的年級
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        all_allavg: 2d np.array, float
+            所有學生每學期的的全科目平均分數
+        all_allcredit: 2d np.array, float
+            所有學生每學期的的總學分數
+        all_core1avg: np.array, float
+            所有學生的微積分、普通化學與普通物理學平均分數
+        df_corse1data: pd.DataFrame
+            所有學生修習的微積分、普通化學與普通物理學課程的等第成績、等第積分與學分數總表
+        all_groupavg: 2d np.array, float
+            所有學生每組的平均(列為學生, 行為組), 放在三科平均之前
+        group_columns: list, str
+            每組平均的欄位名稱
+        trendavg: list, tuple
+            (欄位名稱, 所有學生每學期的平均), 依序放在每學期的總學分數之後 eg. [(' 累計平均', 2d np.array)]
+        sheetname_new: list, str
+            含有所有學期名稱平均和總學分數名稱的列表，為df_alldata中一部分的欄位名稱
+        column: list, str
+            df_avgdata的欄位名稱
         data_allavg_allcredit: list, np.array, (float or int)
             df_alldata中的所有學生的每學期所有科目平均與總學分數資料
+        data_groupavg: list, list, float
+            df_alldata中的所有學生每組的平均資料
         data: list, np.array, (float or int)
             df_alldata中的所有學生的學號、名字、系所名稱、每學期所有科目平均與總學分數以及三科平均的資料
         df_avgdata: pd.DataFrame
@@ -482,40 +2005,434 @@ class arrangement:
         df_alldata: pd.DataFrame
             df_avgdata和df_corse1data合併後的總表，其為所有學生的所有平均分數以及修習的三科資料總表
         """
-        all_students_id = self.all_students_id
-        all_students_name = self.all_students_name
-        all_students_department = self.all_students_department
-        all_students_year = self.all_students_year
-        df_gradedata_split, sheetname = self.df_gradedata_split
-        all_allavg = []
-        all_allcredit = []
-        all_core1avg = []
-        df_corse1data = pd.DataFrame()
         sheetname_new = []
         for sheetnamei in sheetname:
             sheetname_new.append(sheetnamei+' 所有科目平均')
             sheetname_new.append(sheetnamei+' 總學分數')
-        column = ['學號','學生姓名','學生本學系', '年級'] + sheetname_new + ['三科平均']
-        for student_id in all_students_id: # 獲得所有學生成績資料的list
-            allavg, allcredit = self.calc_allavg(student_id, True)
-            core1avg, fulldata = self.calc_core1avg(student_id, True)
-            all_allavg.append(allavg)
-            all_allcredit.append(allcredit)
-            df_corse1data = pd.concat([df_corse1data, pd.DataFrame([fulldata])], ignore_index=True) # 合併所有學生修習三科的成績資料
-            all_core1avg.append(core1avg)
+            for suffix, _ in trendavg:
+                sheetname_new.append(sheetnamei+suffix)
+        column = ['學號','學生姓名','學生本學系', '年級'] + sheetname_new + list(group_columns) + ['三科平均']
         
         # 獲得df_alldata表的資料
         data_allavg_allcredit = []
-        all_allavg = np.array(all_allavg)
-        all_allcredit = np.array(all_allcredit)
-        for all_allavgi, all_allcrediti in zip(all_allavg.T, all_allcredit.T):
+        all_allavg = np.asarray(all_allavg, dtype=float).reshape(len(all_students_id), len(sheetname))
+        all_allcredit = np.asarray(all_allcredit, dtype=float).reshape(len(all_students_id), len(sheetname))
+        trendavg = [np.asarray(avg, dtype=float).reshape(len(all_students_id), len(sheetname)) for _, avg in trendavg]
+        for i, (all_allavgi, all_allcrediti) in enumerate(zip(all_allavg.T, all_allcredit.T)):
             data_allavg_allcredit.append(all_allavgi.tolist())
             data_allavg_allcredit.append(all_allcrediti.tolist())
+            for avg in trendavg:
+                data_allavg_allcredit.append(avg[:, i].tolist())
+        data_groupavg = [] if all_groupavg is None else np.asarray(all_groupavg, dtype=float).reshape(len(all_students_id), len(group_columns)).T.tolist()
         data = [all_students_id, all_students_name, all_students_department, all_students_year] +\
-        data_allavg_allcredit + [all_core1avg]
+        data_allavg_allcredit + data_groupavg + [list(all_core1avg)]
         df_avgdata = pd.DataFrame(zip(*data), columns=column)
         df_alldata = pd.concat([df_avgdata, df_corse1data], axis=1)
+        return df_alldata
+    
+    def update_gradedata(self, df_delta):
+        """
+        
+        以少量補登或更正的成績更新成績總表與df_alldata, 只重新計算這些成績所屬學生的每學期平均、總學分數與三科平均
+        (重修的判斷也只對這些學生重做), 結果與以更新後的成績總表重新呼叫get_df_alldata完全相同, df_rankdata也會依更新後的結果排名:
+        1. 學年、學期、學號與課程識別碼都和成績總表中某筆成績相同時, 取代該筆成績(位置不變)
+        2. 其他的成績依序加在成績總表的最後面
+        更新只存在記憶體中, 成績檔被修改而重新解析時就會被捨棄
+        
+        ----------
+        Parameters
+        ----------
+        df_delta: pd.DataFrame
+            補登或更正的成績, 欄位與成績檔相同(學年、學期、學號、學生姓名、課程識別碼或課號、課名、學分、成績、年級、學生本學系)
+        grade_key: function
+            取得每筆成績的(學年, 學期, 學號, 課程識別碼), 用來判斷是否為同一筆成績
+        df_gradedata: pd.DataFrame
+            更新後的成績總表
+        sheetname: list, str
+            更新後的學期名稱
+        affected_id: list, str
+            成績有變動的學生的學號
+        df_affected: pd.DataFrame
+            成績有變動的學生的所有成績, 依學期順序排列
+        allgrades: 2d np.array, float
+            成績有變動的學生不同學期的等第積分乘上學分數的總和
+        allcredits: 2d np.array, float
+            成績有變動的學生不同學期的總學分數
+        df_core1: pd.DataFrame
+            所有學生的三科成績表, 其中成績有變動的學生的部分重新挑選
+        position: np.array, int
+            每個學生在更新前的df_alldata中的位置(新的學生為-1)
+        target: np.array, int
+            成績有變動的學生在更新後的df_alldata中的位置
+        trendavg: list, tuple
+            所有學生每學期的累計平均與近幾學期平均(有開啟時), 其他學生沿用原本的結果; 學期改變時改為全部重新計算
+        groupavg: 2d np.array, float
+            所有學生每組的平均與三科平均(最後一行)
+        df_alldata: pd.DataFrame
+            更新後所有學生的所有平均分數以及修習的三科資料總表
+        """
+        if self.streaming:
+            raise ValueError('串流模式沒有成績總表, 無法以update_gradedata更新成績')
+        with self.stage('update_gradedata') as record:
+            cache = self.load_gradedata()
+            df_gradedata_old, sheetname_old = cache['df_gradedata'], cache['sheetname']
+            df_delta = df_delta.rename(columns={'課號':'課程識別碼'}).replace('\xa0\xa0', np.nan).reset_index(drop=True)
+            df_delta, _ = self.normalize_gradedata(df_delta)
+            df_delta = df_delta.reindex(columns=df_gradedata_old.columns)
+            record['rows'] += len(df_delta)
+            
+            # 取代相同的成績或加在最後面
+            grade_key = lambda df: pd.MultiIndex.from_arrays([pd.to_numeric(df['學年']).to_numpy(dtype=float), pd.to_numeric(df['學期']).to_numpy(dtype=float),\
+                                                               df['學號'].to_numpy(dtype=object), df['課程識別碼'].to_numpy(dtype=object)])
+            df_delta = df_delta[~grade_key(df_delta).duplicated(keep='last')].reset_index(drop=True)
+            delta_key = grade_key(df_delta)
+            gradedata_key = grade_key(df_gradedata_old)
+            replaced = delta_key.get_indexer(gradedata_key)
+            take = np.where(replaced >= 0, replaced + len(df_gradedata_old), np.arange(len(df_gradedata_old)))
+            take = np.concatenate([take, np.flatnonzero(~delta_key.isin(gradedata_key)) + len(df_gradedata_old)])
+            df_gradedata = pd.concat([df_gradedata_old.astype({coli:object for coli in self.category_columns if coli in df_gradedata_old}),\
+                                      df_delta.astype({coli:object for coli in self.category_columns if coli in df_delta})], ignore_index=True)
+            df_gradedata = self.drop_adjacent_duplicates(df_gradedata.iloc[take])
+            for coli in self.category_columns:
+                if coli in df_gradedata:
+                    df_gradedata[coli] = df_gradedata[coli].astype('category')
+            df_gradedata = self.compact_gradedata(df_gradedata)
+            sheetname = pd.unique(df_gradedata['學年'].astype(str) + '_' + df_gradedata['學期'].astype(str)).tolist()
+            df_core1_old = cache['df_core1']
+            cache.update({'df_gradedata':df_gradedata, 'sheetname':sheetname, 'semester_rows':None, 'df_core1':None, 'student_lookup':None})
+            df_alldata_old = self.__df_alldata
+            if ( df_alldata_old is None ) or ( df_core1_old is None ) or ( len(df_alldata_old) == 0 ):
+                return self.get_df_alldata()
+            
+            # 只重新計算成績有變動的學生
+            all_students_id = self.all_students_id
+            affected = pd.unique(df_delta['學號'].astype(object))
+            selected = df_gradedata['學號'].isin(affected).to_numpy()
+            df_affected, semester = df_gradedata[selected], self.semester_rows[0][selected]
+            order = np.argsort(semester, kind='stable') # 和semester_rows中依學期排列的順序相同
+            df_affected, semester = df_affected.iloc[order], semester[order]
+            affected_id = list(self.dedupe(df_affected['學號'].astype(object)))
+            student = pd.Index(affected_id).get_indexer(df_affected['學號'])
+            graded = df_affected['等第積分'].notna().to_numpy()
+            allgrades, allcredits = self.semester_sums(student[graded], semester[graded], df_affected['等第積分'].to_numpy(dtype=float)[graded],\
+                                                       df_affected['學分'].to_numpy(dtype=float)[graded], len(affected_id), len(sheetname))
+            df_core1_affected, student_core1, core1grade, core1credit = self.core1_sums(self.core1_gradedata(df_affected), affected_id)
+            df_core1 = pd.concat([df_core1_old[~df_core1_old['學號'].isin(affected).to_numpy()], df_core1_affected])
+            df_core1 = df_core1.iloc[np.argsort(pd.Index(all_students_id).get_indexer(df_core1['學號']), kind='stable')]
+            cache['df_core1'] = df_core1
+            
+            # 其他學生沿用原本的結果
+            position = pd.Index(df_alldata_old['學號']).get_indexer(all_students_id)
+            target = pd.Index(all_students_id).get_indexer(affected_id)
+            allavg = np.zeros((len(all_students_id), len(sheetname)))
+            allcredit = np.zeros((len(all_students_id), len(sheetname)))
+            for i, sheetnamei in enumerate(sheetname):
+                if sheetnamei in sheetname_old:
+                    allavg[:, i] = df_alldata_old[sheetnamei+' 所有科目平均'].to_numpy(dtype=float)[position]
+                    allcredit[:, i] = df_alldata_old[sheetnamei+' 總學分數'].to_numpy(dtype=float)[position]
+            allavg[target], allcredit[target] = self.calc_avg(allgrades, allcredits), allcredits
+            trendavg = self.calc_trendavg(allgrades, allcredits, sheetname)
+            if trendavg and ( sheetname != sheetname_old ): # 學期改變時其他學生的累計平均與近幾學期平均也可能改變
+                return self.get_df_alldata()
+            for i, (suffix, avg) in enumerate(trendavg):
+                trendavg[i] = (suffix, np.column_stack([df_alldata_old[sheetnamei+suffix].to_numpy(dtype=float) for sheetnamei in sheetname])[position])
+                trendavg[i][1][target] = avg
+            columns = self.group_columns + ['三科平均']
+            groupavg = df_alldata_old.reindex(columns=columns).to_numpy(dtype=float)[position]
+            groupavg[target] = self.calc_avg(core1grade, core1credit)[:, -len(columns):]
+            info = {}
+            for coli, skipna in (('學生姓名', False), ('學生本學系', True), ('年級', False)):
+                info[coli] = df_alldata_old[coli].to_numpy(dtype=object)[position]
+                info[coli][target] = self.students_first_data(coli, [df_affected], skipna).reindex(affected_id).to_numpy(dtype=object)
+            core_course1_name = df_core1['課名'].astype(object).unique()
+            course_old = df_alldata_old.columns[df_alldata_old.columns.get_loc('三科平均')+1:]
+            data = np.full((len(all_students_id), len(core_course1_name)), np.nan, dtype=object)
+            for i, cne in enumerate(core_course1_name):
+                if cne in course_old:
+                    data[:, i] = df_alldata_old[cne].to_numpy(dtype=object)[position]
+            data[target] = self.core1_table(df_core1_affected, student_core1, len(affected_id), core_course1_name).to_numpy(dtype=object)
+            df_alldata = self.make_df_alldata(all_students_id, info['學生姓名'].tolist(), info['學生本學系'].tolist(), info['年級'].tolist(), sheetname,\
+                                              allavg, allcredit, groupavg[:, -1], pd.DataFrame(data, columns=core_course1_name), groupavg[:, :-1], columns[:-1], trendavg)
+            self.__df_alldata = df_alldata
+        return df_alldata
+    
+    def iter_gradedata(self):
+        """
+        
+        以iter_rows逐列讀取成績檔(xlsx或csv/tsv), 每次產生一筆已整理好的成績(dict),
+        處理方式與read_gradedata及normalize_gradedata相同: 跳過前兩列、將"課號"欄改名為課程識別碼、
+        將'\xa0\xa0'視為空白、去除文字欄位的空白、檢查成績(與validate_gradedata相同)、換算等第積分並刪除相鄰的重複成績
+        
+        ----------
+        Parameters
+        ----------
+        grade_points: dictionary, str:(float or None)
+            將等第成績轉換為等第積分的字典(grade_dict加上grade_map)
+        delimited: boolean
+            是否為csv/tsv成績檔(數值欄位需要由字串轉為數值)
+        rows: generator
+            由iter_rows產生的每一列的值
+        col: list, str
+            成績總表的欄位名稱
+        row: dict
+            一筆成績
+        key: tuple
+            用來判斷相鄰兩筆成績是否重複的欄位值
+        prev_key: tuple
+            上一筆成績的key
+        problems: list, tuple
+            一筆成績的(欄位, 問題, 是否為錯誤)
+        issues: list, list
+            有問題的成績(每種問題只保留前report_limit筆), 讀完後以check_report存為validation_report(有無法計算的成績且skip_invalid為False時產生ValueError)
+        counts: dict, str:int
+            每種問題的總數
+        blocks: set, tuple
+            已出現過的(學年, 學期, 學號), 用來判斷學生的成績是否不連續
+        prev_block: tuple
+            上一筆成績的(學年, 學期, 學號)
+        """
+        grade_points = self.grade_points
+        delimited = self.delimiter is not None
+        self.parse_count += 1
+        rows = self.iter_rows()
+        issues = []
+        counts = {}
+        blocks = set()
+        prev_block = None
+        try:
+            col = None
+            prev_key = None
+            for r_idx, values in enumerate(rows):
+                if r_idx < 2: # 前兩列不是成績資料
+                    continue
+                if all(( value is None ) or ( value == '\xa0\xa0' ) for value in values):
+                    continue
+                if col is None: # 取得欄位名, 若欄位名中有名為"課號"的欄，將其改為課程識別碼
+                    col = ['課程識別碼' if coli == '課號' else coli for coli in values]
+                    continue
+                row = {}
+                for coli, value in zip(col, values):
+                    if value == '\xa0\xa0':
+                        value = np.nan
+                    elif delimited and ( coli not in self.text_columns ) and isinstance(value, str): # 文字檔中的數值都是字串
+                        value = self.parse_number(value)
+                    elif isinstance(value, float) and value.is_integer(): # 和pd.read_excel一樣將整數值的浮點數轉為整數
+                        value = int(value)
+                    elif ( coli in self.text_columns ) and isinstance(value, str):
+                        value = value.strip()
+                    row[coli] = np.nan if value is None else value
+                problems = self.validate_row(row, grade_points)
+                if not problems: # 無法計算的成績不影響成績是否連續的判斷
+                    block = (row['學年'], row['學期'], row['學號'])
+                    if ( block != prev_block ) and ( block in blocks ):
+                        problems.append(('學號', '學生成績不連續', False))
+                    blocks.add(block)
+                    prev_block = block
+                for coli, problem, error in problems:
+                    counts[problem] = counts.get(problem, 0) + 1
+                    if counts[problem] <= self.report_limit:
+                        issues.append([r_idx + 1, row['學號'], coli, row[coli], problem, error])
+                if any(error for _, _, error in problems): # 無法計算的成績不列入計算, 讀完後再一起回報
+                    continue
+                if isinstance(row['成績'], str):
+                    row['等第積分'] = np.nan if grade_points[row['成績']] is None else grade_points[row['成績']]
+                else:
+                    row['等第積分'] = np.nan
+                key = tuple(row[coli] for coli in self.duplicate_columns)
+                if ( prev_key is not None ) and all(( ki == kj ) and ( ki == ki ) for ki, kj in zip(key, prev_key)): # 刪除重複成績(空白的值不算相同)
+                    continue
+                prev_key = key
+                yield row
+            self.check_report(pd.DataFrame(issues, columns=self.report_columns), counts)
+        finally:
+            rows.close()
+    
+    @staticmethod
+    def validate_row(row, grade_points):
+        """
+        
+        串流模式中檢查一筆成績, 檢查的項目與validate_gradedata的前三種相同(未知的等第成績、學分不是數值、缺少學號)
+        
+        ----------
+        Parameters
+        ----------
+        row: dict
+            一筆成績
+        grade_points: dictionary, str:(float or None)
+            將等第成績轉換為等第積分的字典
+        credit: (int or float or str)
+            學分數(字串時轉為數值)
+        problems: list, tuple
+            這筆成績的(欄位, 問題, 是否為錯誤)
+        """
+        problems = []
+        graded = isinstance(row['成績'], str)
+        if graded and ( row['成績'] not in grade_points ):
+            problems.append(('成績', '未知的等第成績', True))
+        credit = arrangement.parse_number(row['學分']) if isinstance(row['學分'], str) else row['學分']
+        if not ( isinstance(credit, (int, float)) and ( credit == credit ) ) and ( ( row['學分'] == row['學分'] ) or graded ):
+            problems.append(('學分', '學分不是數值', True))
+        if ( ( row['學號'] != row['學號'] ) or ( row['學號'] == '' ) ) and any(value == value for coli, value in row.items() if coli != '學號'):
+            problems.append(('學號', '缺少學號', True))
+        return problems
+    
+    def iter_rows(self):
+        """
+        
+        逐列產生成績檔中每一列的值(tuple): xlsx檔以openpyxl的唯讀模式讀取, csv/tsv檔以csv模組讀取(空白的值為None, 其餘為字串)
+        
+        ----------
+        Parameters
+        ----------
+        book: openpyxl.Workbook
+            以唯讀模式開啟的成績檔
+        """
+        if self.delimiter is not None:
+            with open(self.grade_path, newline='', encoding=self.delimited_encoding()) as f:
+                for values in csv.reader(f, delimiter=self.delimiter):
+                    yield tuple(value if value != '' else None for value in values)
+        else:
+            book = openpyxl.load_workbook(self.grade_path, read_only=True, data_only=True)
+            try:
+                yield from book.worksheets[0].iter_rows(values_only=True)
+            finally:
+                book.close()
+    
+    @staticmethod
+    def parse_number(value):
+        """
+        
+        將文字檔中的一個值轉為數值(結果與coerce_numeric相同, 整數值的浮點數轉為整數), 不能轉換時回傳原本的字串
+        
+        ----------
+        Parameters
+        ----------
+        value: str
+            文字檔中的一個值
+        number: float
+            轉換後的數值
+        """
+        try:
+            number = float(value)
+        except ValueError:
+            return value
+        return int(number) if number.is_integer() else number
+    
+    def stream_df_alldata(self):
+        """
+        
+        以串流方式計算df_alldata: 逐列讀取成績檔, 只保留每個學生每學期的等第積分與學分數總和以及三科成績,
+        記憶體用量只和學生人數有關, 與成績的筆數無關, 結果與get_df_alldata相同
+        (同一個學生同一個學期的成績需連續排列才會和get_df_alldata的浮點數加總順序完全一致)
+        
+        ----------
+        Parameters
+        ----------
+        course_rules: list, dict
+            由course_rules編譯好的三科課程分組規則
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        semester_pos: dict, str:int
+            學期名稱在sheetname中的位置
+        students: dict, str:list
+            每個學生第一筆成績的位置(學期位置, 列數)以及姓名與年級
+        departments: dict, str:tuple
+            每個學生第一筆不是空白的系所名稱與其位置
+        sums: dict, tuple:list, float
+            每個學生每學期的等第積分乘上學分數的總和與總學分數
+        buffer_key: tuple
+            目前正在累加的(學號, 學期位置)
+        buffer: list, list, float
+            目前正在累加的等第積分乘上學分數與學分數
+        core1: dict, str:dict
+            每個學生修習的三科成績, 重複修習相同課名時只保留最新的一筆
+        all_students_id: list, str
+            所有學生的學號
+        core1rows: list, list
+            所有學生的三科成績(學生位置, 組, 等第積分, 學分數), 依學生與新到舊排列
+        core1grade: 2d np.array, float
+            所有學生每組與合併(最後一行)的等第積分乘上學分數的總和
+        core1credit: 2d np.array, float
+            所有學生每組與合併(最後一行)的總學分數
+        df_alldata: pd.DataFrame
+            所有學生的所有平均分數以及修習的三科資料總表
+        """
+        course_rules = self.course_rules
+        sheetname = []
+        semester_pos = {}
+        students = {}
+        departments = {}
+        sums = {}
+        core1 = {}
+        buffer_key, buffer = None, ([], [])
+        
+        def flush(): # 將累加中的資料加總後存入sums
+            if buffer_key is not None and buffer[0]:
+                total = sums.setdefault(buffer_key, [0.0, 0.0])
+                total[0] += np.sum(np.array(buffer[0]))
+                total[1] += np.sum(np.array(buffer[1]))
+        
+        with self.stage('stream_gradedata') as record:
+            r_idx = -1
+            for r_idx, row in enumerate(self.iter_gradedata()):
+                sheetnamei = str(row['學年']) + '_' + str(row['學期'])
+                if sheetnamei not in semester_pos:
+                    semester_pos[sheetnamei] = len(sheetname)
+                    sheetname.append(sheetnamei)
+                student_id = row['學號']
+                position = (semester_pos[sheetnamei], r_idx)
+                if ( student_id not in students ) or ( position < students[student_id][0] ):
+                    students[student_id] = [position, row['學生姓名'], row['年級']]
+                if ( row['學生本學系'] == row['學生本學系'] ) and ( ( student_id not in departments ) or ( position < departments[student_id][0] ) ):
+                    departments[student_id] = (position, row['學生本學系'])
+                if ( student_id, position[0] ) != buffer_key:
+                    flush()
+                    buffer_key, buffer = ( student_id, position[0] ), ([], [])
+                if row['等第積分'] == row['等第積分']: # 只計算有等第成績的資料
+                    credit = float(row['學分'])
+                    buffer[0].append(row['等第積分'] * credit)
+                    buffer[1].append(credit)
+                    cne = row['課名']
+                    group = self.course_group(cne, course_rules)
+                    if group >= 0: # 若重複修習相同課名, 取最新的資料
+                        order = (-float(row['學年']), -float(row['學期']), r_idx)
+                        core1i = core1.setdefault(student_id, {})
+                        if ( cne not in core1i ) or ( order < core1i[cne][0] ):
+                            core1i[cne] = (order, row['成績'], row['等第積分'], row['學分'], group)
+            flush()
+            record['rows'] += r_idx + 1
+            record['bytes_read'] += os.path.getsize(self.grade_path)
+        
+        # 依照學生第一次出現的學期與順序排列
+        all_students_id = sorted(students, key=lambda student_id: students[student_id][0])
+        student_pos = {student_id:i for i, student_id in enumerate(all_students_id)}
+        allgrades = np.zeros((len(all_students_id), len(sheetname)))
+        allcredits = np.zeros((len(all_students_id), len(sheetname)))
+        for (student_id, semester), (gradesum, creditsum) in sums.items():
+            allgrades[student_pos[student_id], semester] = gradesum
+            allcredits[student_pos[student_id], semester] = creditsum
+        core1rows = [[], [], [], []]
+        fulldata = []
+        for i, student_id in enumerate(all_students_id):
+            courses = sorted(core1.get(student_id, {}).items(), key=lambda item: item[1][0])
+            for _, (_, _, gde, cde, group) in courses:
+                for core1rowsi, value in zip(core1rows, (i, group, gde, float(cde))):
+                    core1rowsi.append(value)
+            fulldata.append({cne:gne + ' ' + str(gde) + ' ' + str(cde).strip() for cne, (_, gne, gde, cde, _) in courses})
+        core1grade, core1credit = self.group_sums(*[np.array(core1rowsi, dtype=dtype) for core1rowsi, dtype in zip(core1rows, (int, int, float, float))], len(all_students_id))
+        groupavg = self.calc_avg(core1grade, core1credit)
+        group_columns = self.group_columns
+        core_course1_name = list(self.dedupe(cne for fulldatai in fulldata for cne in fulldatai))
+        df_corse1data = pd.DataFrame([[fulldatai.get(cne, np.nan) for cne in core_course1_name] for fulldatai in fulldata],\
+                                     columns=core_course1_name, dtype=object)
+        df_alldata = self.make_df_alldata(all_students_id,\
+                                          [students[student_id][1] for student_id in all_students_id],\
+                                          [departments[student_id][1] if student_id in departments else np.nan for student_id in all_students_id],\
+                                          [students[student_id][2] for student_id in all_students_id],\
+                                          sheetname, self.calc_avg(allgrades, allcredits), allcredits, groupavg[:, -1], df_corse1data,\
+                                          groupavg[:, -len(group_columns)-1:-1], group_columns, self.calc_trendavg(allgrades, allcredits, sheetname))
         self.__df_alldata = df_alldata
+        self.__df_alldata_stat = self.file_stat()
         return df_alldata
     
     @property
@@ -526,37 +2443,172 @@ class arrangement:
         df_alldata: pd.DataFrame
             所有學生的所有平均分數資料總表
         """
+        if self.streaming:
+            if ( self.__df_alldata is None ) or ( self.__df_alldata_stat != self.file_stat() ):
+                return self.stream_df_alldata()
+            return self.__df_alldata
+        self.load_gradedata() # 成績檔被修改時會一併清除舊的計算結果
         if self.__df_alldata is None:
             return self.get_df_alldata()
         else:
             return self.__df_alldata
     
+    def rank_values(self, df_data, keys=None):
+        """
+        
+        將每個排名依據轉為"越小越前面"的浮點數陣列: 由大到小排名的欄位取負號, 文字欄位轉為排序後的代碼, 空白的值排在最後
+        
+        ----------
+        Parameters
+        ----------
+        df_data: pd.DataFrame
+            要排名的資料總表
+        keys: list, (str or tuple)
+            排名所依照的各種先後順序, 格式與rank_keys相同, 預設為rank_keys
+        column: str or function
+            欄位名稱或計算排名依據的函數
+        ascending: boolean
+            是否由小到大排名
+        value: np.array, float
+            轉換後的排名依據
+        values: list, np.array, float
+            所有轉換後的排名依據, 第一個為最優先的依據
+        """
+        values = []
+        for key in ( self.rank_keys if keys is None else keys ):
+            column, ascending = key if isinstance(key, tuple) else (key, False)
+            value = pd.Series(column(df_data) if callable(column) else df_data[column])
+            if value.dtype.kind in 'biuf':
+                value = value.to_numpy(dtype=float)
+            else: # 文字欄位依照排序後的代碼排名
+                value = pd.factorize(value, sort=True)[0].astype(float)
+                value[value < 0] = np.nan
+            if not ascending:
+                value = -value
+            values.append(np.where(np.isnan(value), np.inf, value))
+        return values
+    
+    def calc_rank(self, df_data=None, keys=None):
+        """
+        
+        依照keys計算每位學生的排名(同分時取最小的名次, 與pd.Series.rank(method='min')相同),
+        以np.lexsort一次排序所有依據, 不必為每位學生建立tuple
+        
+        ----------
+        Parameters
+        ----------
+        df_data: pd.DataFrame
+            要排名的資料總表, 預設為df_alldata
+        keys: list, (str or tuple)
+            排名所依照的各種先後順序, 格式與rank_keys相同, 預設為rank_keys
+        values: list, np.array, float
+            轉換後的排名依據
+        order: np.array, int
+            依排名排列的索引(同名次時維持原本的順序)
+        tied: np.array, boolean
+            依排名排列後, 每位學生的所有依據是否都與前一位相同
+        ranklist: np.array, float
+            每位學生的排名
+        """
+        if df_data is None:
+            df_data = self.df_alldata
+        values = self.rank_values(df_data, keys)
+        order = np.lexsort(values[::-1]) # np.lexsort以最後一個依據為最優先
+        tied = np.zeros(len(order), dtype=bool)
+        if len(order) > 1:
+            tied[1:] = np.logical_and.reduce([value[order][1:] == value[order][:-1] for value in values])
+        ranklist = np.empty(len(order))
+        ranklist[order] = np.maximum.accumulate(np.where(tied, 0, np.arange(len(order)))) + 1
+        return ranklist
+    
+    def top_students(self, k, df_data=None, keys=None):
+        """
+        
+        取得排名前k名的學生(與第k名同名次的學生也會列入), 依排名排列並在第一欄加上排名;
+        先以np.argpartition只找出第k名最優先依據的值, 再只對不輸給它的學生排序, 不必排序所有學生
+        
+        ----------
+        Parameters
+        ----------
+        k: int
+            名次
+        df_data: pd.DataFrame
+            要排名的資料總表, 預設為df_alldata
+        keys: list, (str or tuple)
+            排名所依照的各種先後順序, 格式與rank_keys相同, 預設為rank_keys
+        values: list, np.array, float
+            轉換後的排名依據
+        candidate: np.array, int
+            最優先依據不輸給第k名的學生(比他們前面的學生也都在其中, 因此在其中算出的排名就是整體的排名)
+        ranklist: np.array, float
+            candidate中每位學生的排名
+        df_top: pd.DataFrame
+            前k名學生的排名總表
+        """
+        if df_data is None:
+            df_data = self.df_alldata
+        k = min(int(k), len(df_data))
+        if k <= 0:
+            df_top = df_data.iloc[:0].copy()
+            df_top.insert(0, '排名', pd.Series(dtype=float))
+            return df_top
+        values = self.rank_values(df_data, keys)
+        threshold = values[0][np.argpartition(values[0], k - 1)[k - 1]]
+        candidate = np.flatnonzero(values[0] <= threshold)
+        df_top = df_data.iloc[candidate]
+        ranklist = self.calc_rank(df_top, keys)
+        order = np.argsort(ranklist, kind='stable')
+        order = order[ranklist[order] <= k]
+        df_top = df_top.iloc[order].copy()
+        df_top.insert(0, '排名', ranklist[order])
+        return df_top
+    
+    def top_percent(self, percent, df_data=None, keys=None):
+        """
+        
+        取得排名前percent%的學生(名次不超過學生人數的percent%, 無條件進位), 依排名排列並在第一欄加上排名
+        
+        ----------
+        Parameters
+        ----------
+        percent: float
+            百分比 eg. 10代表前10%
+        df_data: pd.DataFrame
+            要排名的資料總表, 預設為df_alldata
+        keys: list, (str or tuple)
+            排名所依照的各種先後順序, 格式與rank_keys相同, 預設為rank_keys
+        """
+        if df_data is None:
+            df_data = self.df_alldata
+        return self.top_students(int(np.ceil(len(df_data) * percent / 100 - 1e-9)), df_data, keys)
+    
     @property
     def df_rankdata(self):
         """
         
-        進行排名的計算(可有可無)
+        進行排名的計算(可有可無), 排名依照rank_keys, 同名次的學生維持df_alldata中的順序
         
         ----------
         Parameters
         ----------
-        col_all: list, str
-            排名所依照的各種先後順序，順序由左到右
         df_alldata: pd.DataFrame
             所有學生的所有平均分數資料總表
+        ranklist: np.array, float
+            每位學生的排名
         df_rankdata: pd.DataFrame
             包含所有學生所有平均分數資料的排名總表
         """
-        col_all = ['三科平均']
         df_alldata = self.df_alldata
-        df_rankdata = df_alldata.copy()
-        ranklist = df_rankdata[col_all].apply(tuple, axis=1).rank(method='min', ascending=0)
-        df_rankdata.insert(0, '排名', ranklist) #插入一欄紀錄每位學生的排名
-        df_rankdata.sort_values('排名', inplace=True) #將此表格以排名來排序
-        df_rankdata.index = df_alldata.index
+        with self.stage('df_rankdata') as record:
+            record['rows'] += len(df_alldata)
+            df_rankdata = df_alldata.copy()
+            ranklist = self.calc_rank(df_alldata)
+            df_rankdata.insert(0, '排名', ranklist) #插入一欄紀錄每位學生的排名
+            df_rankdata = df_rankdata.iloc[np.argsort(ranklist, kind='stable')] #將此表格以排名來排序
+            df_rankdata.index = df_alldata.index
         return df_rankdata
     
-    def save_df_data(self, df_data, savepath, sheet_name, method='dataframe_to_rows'):
+    def save_df_data(self, df_data, savepath, sheet_name, method=None, overwrite=False):
         """
         
         將排名後的資料儲存至指定路徑
@@ -569,35 +2621,462 @@ class arrangement:
         sheet_name: str
             設定結果的excel檔中的工作表名稱
         method: str
-            存檔的方法有兩種:
+            存檔的方法有三種(預設為None: 檔案還不存在時使用write_only, 已存在時使用dataframe_to_rows以保留原有工作表的格式):
             1. ExcelWriter: 程式碼比較簡潔，但我當初在編寫時有時候會產生出損毀過的excel檔
             2. dataframe_to_rows: 程式碼看起來比較繁雜，但是可以產生出正常的excel檔
+            3. write_only: 以openpyxl的唯寫模式整列寫入，速度最快且可以產生出正常的excel檔;
+               若檔案已存在，原本的工作表會以唯讀模式逐列複製到新檔案，不必把整個檔案載入記憶體，
+               但只保留儲存格的值，原有工作表的字型、欄寬與合併儲存格等格式都會遺失
+               (有安裝lxml時openpyxl會自動使用lxml來寫入, 速度會再快好幾倍)
+        overwrite: boolean
+            是否取代已存在的檔案(以write_only寫入暫存檔, 成功後才取代原本的檔案)
         df_rankdata: pd.DataFrame
             包含所有學生所有平均分數資料的排名總表
         """
-        if method == 'ExcelWriter':
-            if os.path.exists(savepath):
-                writer = pd.ExcelWriter(savepath, engine='openpyxl', mode='a')
-                book = openpyxl.load_workbook(savepath)
-                writer.book = book
+        if overwrite:
+            method = 'write_only'
+        elif method is None:
+            method = 'dataframe_to_rows' if os.path.exists(savepath) else 'write_only'
+        with self.stage('save_df_data') as record:
+            record['rows'] += len(df_data)
+            if method == 'ExcelWriter':
+                if os.path.exists(savepath):
+                    writer = pd.ExcelWriter(savepath, engine='openpyxl', mode='a')
+                    book = openpyxl.load_workbook(savepath)
+                    writer.book = book
+                else:
+                    writer = pd.ExcelWriter(savepath, engine='openpyxl')
+                    book = openpyxl.Workbook()
+                df_data.to_excel(writer, sheet_name=sheet_name, index=False)
+                writer.save()
+                writer.close()
+            elif method == 'dataframe_to_rows':
+                rows = dataframe_to_rows(df_data, index=False)
+                if os.path.exists(savepath):
+                    book = openpyxl.load_workbook(savepath)
+                    sheet = book.create_sheet(title=sheet_name)
+                else:
+                    book = openpyxl.Workbook()
+                    sheet = book.active
+                    sheet.title = sheet_name
+                for r_idx, row in enumerate(rows, 1):
+                    for c_idx, value in enumerate(row, 1):
+                         sheet.cell(row=r_idx, column=c_idx, value=value)
+                book.save(filename=savepath)
+            elif method == 'write_only':
+                self.write_only_save(dataframe_to_rows(df_data, index=False), savepath, sheet_name, overwrite)
             else:
-                writer = pd.ExcelWriter(savepath, engine='openpyxl')
-                book = openpyxl.Workbook()
-            df_data.to_excel(writer, sheet_name=sheet_name, index=False)
-            writer.save()
-            writer.close()
-        elif method == 'dataframe_to_rows':
-            rows = dataframe_to_rows(df_data, index=False)
-            if os.path.exists(savepath):
-                book = openpyxl.load_workbook(savepath)
-                sheet = book.create_sheet(title=sheet_name)
+                print('Please input "write_only", "dataframe_to_rows" or "ExcelWriter" to method variable.')
+            if self.profile and os.path.exists(savepath):
+                record['bytes_written'] += os.path.getsize(savepath)
+    
+    def iter_transcripts(self):
+        """
+        
+        依all_students_id的順序(student_lookup中學號的順序)逐一產生每個學生的成績單(學號, 成績單的每一列), 每一列的欄位為transcript_columns,
+        同一個學生的成績依學期(與sheetname相同的順序)與原本的順序排列, 三科成績會在"三科"欄標示;
+        以student_lookup(只建立一次, 與student_report共用)取出每個學生的列位置, 每次只轉換一個學生的成績與判斷其重修,
+        不會為整個成績總表建立物件陣列或三科成績表, 除了成績總表與索引之外的記憶體用量只和單一學生的成績筆數有關
+        
+        ----------
+        Parameters
+        ----------
+        df_gradedata: pd.DataFrame
+            所有學生的成績總表
+        rows: dict, str:np.array, int
+            學號對應到該學生所有成績的列位置(依學期順序排列)
+        arrays: dict, str:np.array
+            student_lookup中各欄的NumPy陣列(類別欄位為代碼)
+        columns: list, tuple
+            transcript_columns中每個欄位的(值或類別代碼, 類別的值或None)
+        names: list, str
+            每組三科的組名
+        rowsi: np.array, int
+            一個學生所有成績的列位置
+        matched: np.array, int
+            該學生的三科成績的列位置
+        newest: np.array, int
+            該學生的三科成績依學年(新到舊)、學期(新到舊)與原始順序排列後的列位置
+        counted: set, int
+            該學生列入三科平均的成績的列位置(重複修習相同課名時只有最新的一筆)
+        values: list, list
+            該學生成績單每個欄位的值
+        """
+        df_gradedata = self.df_gradedata[0]
+        rows, arrays = self.student_lookup
+        columns = []
+        for coli in self.transcript_columns[1:-1]:
+            if isinstance(df_gradedata[coli].dtype, pd.CategoricalDtype):
+                columns.append((df_gradedata[coli].cat.codes.to_numpy(), df_gradedata[coli].cat.categories.to_numpy(dtype=object)))
             else:
-                book = openpyxl.Workbook()
-                sheet = book.active
-                sheet.title = sheet_name
-            for r_idx, row in enumerate(rows, 1):
-                for c_idx, value in enumerate(row, 1):
-                     sheet.cell(row=r_idx, column=c_idx, value=value)
-            book.save(filename=savepath)
-        else:
-            print('Please input "dataframe_to_rows" or "ExcelWriter" to method variable.')
\ No newline at end of file
+                columns.append((df_gradedata[coli].to_numpy(), None))
+        names = [rule['name'] for rule in self.course_rules]
+        for student_id, rowsi in rows.items():
+            matched = rowsi[arrays['core1'][rowsi]]
+            newest = matched[np.lexsort((matched, -arrays['學期'][matched].astype(float), -arrays['學年'][matched].astype(float)))]
+            counted = set(newest[np.unique(arrays['課名'][newest], return_index=True)[1]].tolist())
+            values = [[student_id] * len(rowsi)]
+            for data, categories in columns:
+                if categories is None:
+                    values.append([None if value != value else value for value in data[rowsi].tolist()])
+                else:
+                    values.append([categories[code] if code >= 0 else None for code in data[rowsi].tolist()])
+            values.append([( names[label] if row in counted else names[label] + '(重修前)' ) if core1 else ''\
+                           for row, label, core1 in zip(rowsi.tolist(), arrays['group'][rowsi].tolist(), arrays['core1'][rowsi].tolist())])
+            yield student_id, list(zip(*values))
+    
+    def transcript_rows(self):
+        """
+        
+        依序產生所有學生成績單的每一列(第一列為欄位名稱), 給write_only_save逐列寫入
+        """
+        yield list(self.transcript_columns)
+        for _, rows in self.iter_transcripts():
+            yield from rows
+    
+    def save_transcripts(self, savepath=None, sheet_name='transcripts', per_student=False):
+        """
+        
+        將所有學生的成績單以openpyxl的唯寫模式逐列存檔, 不會先建立整個成績單的表格:
+        per_student為False時所有學生依序存在savepath的同一個工作表中, 為True時savepath為資料夾, 每個學生各存成一個"學號.xlsx"檔;
+        檔案已存在時與save_df_data一樣加上新的工作表
+        
+        ----------
+        Parameters
+        ----------
+        savepath: str
+            成績單的檔案(或資料夾)路徑, 預設為transcripts_path(成績檔路徑, per_student)
+        sheet_name: str
+            成績單的工作表名稱
+        per_student: boolean
+            是否每個學生各存成一個檔案
+        """
+        if savepath is None:
+            savepath = transcripts_path(self.grade_path, per_student)
+        with self.stage('save_transcripts') as record:
+            if per_student:
+                os.makedirs(savepath, exist_ok=True)
+                for student_id, rows in self.iter_transcripts():
+                    self.write_only_save([list(self.transcript_columns)] + rows, os.path.join(savepath, re.sub(r'[\\/:*?"<>|]', '_', str(student_id)) + '.xlsx'), sheet_name)
+                    record['rows'] += len(rows)
+            else:
+                self.write_only_save(self.transcript_rows(), savepath, sheet_name)
+                record['rows'] += len(self.df_gradedata[0])
+            if self.profile:
+                record['bytes_written'] += sum(entry.stat().st_size for entry in os.scandir(savepath)) if per_student else os.path.getsize(savepath)
+        return savepath
+    
+    @staticmethod
+    def write_only_save(rows, savepath, sheet_name, overwrite=False):
+        """
+        
+        以openpyxl的唯寫模式將rows逐列寫入savepath中名為sheet_name的工作表,
+        若檔案已存在, 先以唯讀模式逐列複製原本的工作表(overwrite為True時不複製), 寫完後再取代原本的檔案
+        (只保留儲存格的值, 原有工作表的字型、欄寬與合併儲存格等格式都會遺失)
+        
+        ----------
+        Parameters
+        ----------
+        rows: iterable, list
+            要寫入的每一列資料
+        savepath: str
+            檔案儲存路徑
+        sheet_name: str
+            新工作表的名稱(與原有的工作表同名時openpyxl會自動加上編號)
+        overwrite: boolean
+            是否不保留原本的工作表(寫完後直接取代原本的檔案)
+        book: openpyxl.Workbook
+            唯寫模式的活頁簿
+        old_book: openpyxl.Workbook
+            以唯讀模式開啟的原有活頁簿
+        tmppath: str
+            寫入中的暫存檔路徑
+        """
+        book = openpyxl.Workbook(write_only=True)
+        old_book = openpyxl.load_workbook(savepath, read_only=True) if os.path.exists(savepath) and not overwrite else None
+        try:
+            if old_book is not None:
+                for old_sheet in old_book.worksheets:
+                    sheet = book.create_sheet(title=old_sheet.title)
+                    for row in old_sheet.iter_rows(values_only=True):
+                        sheet.append(row)
+            sheet = book.create_sheet(title=sheet_name)
+            for row in rows: # 空白(NaN)的儲存格不寫入, 讀取時和原本寫入空值的結果相同
+                sheet.append([None if ( type(value) is float ) and ( value != value ) else value for value in row])
+            fd, tmppath = tempfile.mkstemp(suffix=os.path.splitext(savepath)[1], dir=os.path.dirname(os.path.abspath(savepath)))
+            os.close(fd)
+            try:
+                book.save(tmppath)
+            except BaseException:
+                os.remove(tmppath)
+                raise
+        finally:
+            if old_book is not None:
+                old_book.close()
+        os.replace(tmppath, savepath)
+
+
+class cohort_union(arrangement):
+    """
+    
+    將多個成績檔(eg. 同一年的轉系、輔系與雙主修)合併成一個成績總表一起計算, 同一個學生出現在多個成績檔時只計算一次,
+    合併計算的df_alldata包含每個學生在所有成績檔中的成績(不同成績檔的學期與課程可能不同, 所以平均不一定與單獨計算某個成績檔時相同),
+    再依成績檔分回各自的結果(application_alldata, 從df_alldata取出該成績檔的學生), 並列出同時申請多種的學生(df_overlapdata)
+    
+    Parameters
+    ----------
+    union_columns: list, str
+        判斷不同成績檔中的成績是否為同一筆時所比對的欄位
+    """
+    
+    union_columns = ['學號', '學年', '學期', '課程識別碼', '學分']
+    
+    def __init__(self, grade_paths, core_course1, sidecar=True, profile=False, profile_log=False, course_groups=None, cumulative_gpa=False, rolling_gpa=0, workers=None,\
+                 grade_map=None, skip_invalid=False):
+        """
+        
+        初始化
+        
+        ----------
+        Parameters
+        ----------
+        grade_paths : list, str
+            所有成績檔的路徑
+        members : list, arrangement
+            每個成績檔各自的arrangement物件(只用來讀取成績檔與取得各自的學生, 可使用各自的暫存資料夾)
+        labels : list, str
+            每個成績檔的申請類別名稱(檔名去掉副檔名) eg. 111輔系
+        """
+        if not grade_paths:
+            raise ValueError('沒有成績檔')
+        super().__init__(grade_paths[0], core_course1, sidecar=False, profile=profile, profile_log=profile_log, course_groups=course_groups,\
+                         cumulative_gpa=cumulative_gpa, rolling_gpa=rolling_gpa, workers=workers)
+        self.grade_paths = list(grade_paths)
+        self.members = [arrangement(grade_path, core_course1, sidecar=sidecar, profile=profile, profile_log=profile_log, course_groups=course_groups,\
+                                    grade_map=grade_map, skip_invalid=skip_invalid) for grade_path in self.grade_paths]
+        self.labels = [os.path.splitext(os.path.basename(grade_path))[0] for grade_path in self.grade_paths]
+    
+    def file_stat(self):
+        """
+        
+        所有成績檔的修改時間與檔案大小
+        """
+        return tuple(member.file_stat() for member in self.members)
+    
+    def file_hash(self, chunk_size=1<<20):
+        """
+        
+        所有成績檔內容的SHA-256雜湊值合併後的雜湊值
+        """
+        return hashlib.sha256(''.join(member.file_hash(chunk_size) for member in self.members).encode('utf-8')).hexdigest()
+    
+    def read_gradedata(self):
+        """
+        
+        讀取所有成績檔(每個成績檔的前處理與單獨計算時相同)並合併成一個成績總表:
+        以union_columns加上該筆成績在同一個成績檔中是第幾筆相同的成績作為鍵, 用雜湊(pd.DataFrame.duplicated)找出已經在前面的成績檔出現過的成績並刪除,
+        因此同一個成績檔中本來就有的多筆相同成績會保留, 不同成績檔中重複的成績只留下第一個成績檔的;
+        union_columns中有空白的成績不會被刪除。學期依各成績檔的排列方向(新到舊或舊到新)排列
+        
+        ----------
+        Parameters
+        ----------
+        frames: list, pd.DataFrame
+            每個成績檔整理好的成績總表
+        columns: list, str
+            所有成績檔的欄位
+        data: dict, str:pd.Series
+            合併後的各欄資料
+        occurrence: np.array, int
+            該筆成績是同一個成績檔中第幾筆鍵相同的成績
+        duplicated: np.array, boolean
+            該筆成績是否已在前面的成績檔出現過
+        sheetname: list, str
+            含有所有學期名稱的列表 eg. 110_1(代表110學年度第一學期)
+        """
+        with self.stage('consolidate') as record:
+            frames = [member.df_gradedata[0] for member in self.members]
+            columns = list(self.dedupe(coli for frame in frames for coli in frame.columns))
+            data = {}
+            for coli in columns:
+                series = [frame[coli] if coli in frame else pd.Series(np.nan, index=frame.index) for frame in frames]
+                if all(isinstance(seriesi.dtype, pd.CategoricalDtype) for seriesi in series):
+                    data[coli] = pd.Series(pd.api.types.union_categoricals(series, sort_categories=True))
+                else:
+                    data[coli] = pd.concat([seriesi.astype(object) if isinstance(seriesi.dtype, pd.CategoricalDtype) else seriesi for seriesi in series], ignore_index=True)
+            df_gradedata = pd.DataFrame(data)
+            record['rows'] += len(df_gradedata)
+            occurrence = np.concatenate([frame.groupby(self.union_columns, sort=False, dropna=False, observed=True).cumcount().to_numpy() for frame in frames])
+            duplicated = df_gradedata[self.union_columns].assign(occurrence=occurrence).duplicated().to_numpy()
+            duplicated &= df_gradedata[self.union_columns].notna().all(axis=1).to_numpy()
+            df_gradedata = df_gradedata[~duplicated].reset_index(drop=True)
+            for coli in self.category_columns:
+                if ( coli in df_gradedata ) and not isinstance(df_gradedata[coli].dtype, pd.CategoricalDtype):
+                    df_gradedata[coli] = df_gradedata[coli].astype('category')
+            df_gradedata = self.compact_gradedata(df_gradedata)
+            sheetname = pd.unique(df_gradedata['學年'].astype(str) + '_' + df_gradedata['學期'].astype(str)).tolist()
+            order = [[( float(year), float(semester) ) for year, semester in (sheetnamei.split('_') for sheetnamei in member.df_gradedata[1])] for member in self.members]
+            if all(orderi == sorted(orderi, reverse=True) for orderi in order):
+                sheetname.sort(key=lambda sheetnamei: tuple(-float(value) for value in sheetnamei.split('_')))
+            elif all(orderi == sorted(orderi) for orderi in order):
+                sheetname.sort(key=lambda sheetnamei: tuple(float(value) for value in sheetnamei.split('_')))
+        return df_gradedata, sheetname
+    
+    @property
+    def application_alldata(self):
+        """
+        
+        依成績檔分回的結果: 合併計算的df_alldata只算一次, 每個成績檔的結果是該成績檔的學生(依該成績檔中第一次出現的順序排列)在df_alldata中的資料,
+        所以同時申請多種的學生在每個成績檔中的平均都相同(包含該學生在所有成績檔中的成績); 學期欄位與df_alldata相同,
+        三科課程只保留這些學生有修習的課程(課程的順序與單獨計算該成績檔時相同)
+        
+        ----------
+        Parameters
+        ----------
+        df_alldata: pd.DataFrame
+            合併計算的所有學生的所有平均分數以及修習的三科資料總表
+        df_core1: pd.DataFrame
+            合併計算時排列好的三科成績表(依學生的順序, 同一學生由新到舊)
+        students: pd.Index, str
+            df_alldata中的學號
+        course_start: int
+            df_alldata中三科課程欄位的起始位置
+        application_alldata: dict, str:pd.DataFrame
+            申請類別對應到該成績檔學生的資料總表
+        all_students_id: list, str
+            一個成績檔的所有學生的學號
+        position: np.array, int
+            該成績檔學生在df_alldata中的位置
+        student: np.array, int
+            每筆三科成績所屬學生在該成績檔學生中的位置(-1代表不在該成績檔中)
+        core_course1_name: list, str
+            依該成績檔學生的順序第一次出現的三科課名
+        """
+        df_alldata = self.df_alldata
+        df_core1 = self.load_gradedata()['df_core1']
+        with self.stage('application_alldata') as record:
+            students = pd.Index(df_alldata['學號'])
+            course_start = df_alldata.columns.get_loc('三科平均') + 1
+            application_alldata = {}
+            for label, member in zip(self.labels, self.members):
+                all_students_id = member.all_students_id
+                position = students.get_indexer(all_students_id)
+                student = pd.Index(all_students_id).get_indexer(df_core1['學號'])
+                core_course1_name = pd.unique(df_core1['課名'].astype(object).to_numpy()[np.argsort(np.where(student >= 0, student, len(all_students_id)), kind='stable')[:np.count_nonzero(student >= 0)]])
+                application_alldata[label] = pd.concat([df_alldata.iloc[position[position >= 0], :course_start], df_alldata.iloc[position[position >= 0]][list(core_course1_name)]], axis=1).reset_index(drop=True)
+                record['rows'] += len(application_alldata[label])
+        return application_alldata
+    
+    @property
+    def df_overlapdata(self):
+        """
+        
+        同時出現在兩個以上成績檔的學生(依合併後的順序排列), 包含基本資料、申請類別與數量、合併計算的各組平均與三科平均,
+        在所有成績檔的學生中的排名(合併排名), 以及在每個成績檔的學生中的排名; 排名與平均都來自合併計算的df_alldata
+        
+        ----------
+        Parameters
+        ----------
+        df_alldata: pd.DataFrame
+            合併計算的所有學生的所有平均分數以及修習的三科資料總表
+        application_alldata: dict, str:pd.DataFrame
+            每個成績檔學生的資料總表(合併計算的結果)
+        applications: dict, str:list
+            學號對應到該學生出現的成績檔
+        overlap: np.array, boolean
+            該學生是否出現在兩個以上的成績檔
+        df_overlapdata: pd.DataFrame
+            同時申請多種的學生的總表
+        ranklist: pd.Series, float
+            學號對應到該學生在一個成績檔的學生中的排名
+        """
+        df_alldata = self.df_alldata
+        application_alldata = self.application_alldata
+        applications = {}
+        for label, df_data in application_alldata.items():
+            for student_id in df_data['學號']:
+                applications.setdefault(student_id, []).append(label)
+        overlap = np.array([len(applications.get(student_id, [])) >= 2 for student_id in df_alldata['學號']], dtype=bool)
+        df_overlapdata = df_alldata.loc[overlap, ['學號', '學生姓名', '學生本學系', '年級'] + self.group_columns + ['三科平均']].reset_index(drop=True)
+        df_overlapdata.insert(4, '申請類別', [', '.join(applications[student_id]) for student_id in df_overlapdata['學號']])
+        df_overlapdata.insert(5, '申請數', [len(applications[student_id]) for student_id in df_overlapdata['學號']])
+        df_overlapdata['合併排名'] = self.calc_rank(df_alldata)[overlap]
+        for label, df_data in application_alldata.items():
+            ranklist = pd.Series(self.calc_rank(df_data), index=df_data['學號'])
+            df_overlapdata[label + ' 排名'] = ranklist.reindex(df_overlapdata['學號']).to_numpy()
+        return df_overlapdata
+    
+    def save_results(self, sheet_name='results', overlap_path=None, overlap_sheet='overlap', overwrite=False):
+        """
+        
+        將每個成績檔的結果存成各自的_results檔(與單獨計算時相同), 並將同時申請多種的學生存成overlap_path;
+        所有結果都計算完成後才開始存檔, 計算失敗時不會改動原本的結果檔
+        
+        ----------
+        Parameters
+        ----------
+        sheet_name: str
+            結果檔的工作表名稱
+        overlap_path: str
+            同時申請多種的學生的結果檔路徑, 預設為第一個成績檔所在資料夾中的overlap_results.xlsx
+        overlap_sheet: str
+            同時申請多種的學生的工作表名稱
+        overwrite: boolean
+            是否取代已存在的結果檔(否則會在原本的結果檔中新增工作表)
+        application_alldata: dict, str:pd.DataFrame
+            申請類別對應到該成績檔學生的資料總表
+        df_overlapdata: pd.DataFrame
+            同時申請多種的學生的總表
+        savepaths: list, str
+            所有結果檔的路徑(最後一個為overlap_path)
+        """
+        if overlap_path is None:
+            overlap_path = os.path.join(os.path.dirname(self.grade_paths[0]), 'overlap_results.xlsx')
+        application_alldata = self.application_alldata
+        df_overlapdata = self.df_overlapdata
+        savepaths = []
+        for grade_path, df_data in zip(self.grade_paths, application_alldata.values()):
+            savepaths.append(results_path(grade_path))
+            self.save_df_data(df_data, savepaths[-1], sheet_name, overwrite=overwrite)
+        self.save_df_data(df_overlapdata, overlap_path, overlap_sheet, overwrite=overwrite)
+        savepaths.append(overlap_path)
+        return savepaths
+
+
+def results_path(grade_path):
+    """
+    
+    成績檔對應的結果檔路徑 eg. 111輔系.xlsx -> 111輔系_results.xlsx (csv/tsv成績檔的結果同樣存成xlsx檔, eg. 111輔系.csv -> 111輔系_results.xlsx)
+    
+    ----------
+    Parameters
+    ----------
+    grade_path: str
+        學生成績的檔案路徑
+    """
+    root, ext = os.path.splitext(grade_path)
+    if ext.lower() in arrangement.delimited_extensions:
+        ext = '.xlsx'
+    return root + '_results' + ext
+
+
+def transcripts_path(grade_path, per_student=False):
+    """
+    
+    成績檔對應的成績單路徑 eg. 111輔系.xlsx -> 111輔系_transcripts.xlsx (per_student為True時為資料夾 111輔系_transcripts)
+    
+    ----------
+    Parameters
+    ----------
+    grade_path: str
+        學生成績的檔案路徑
+    per_student: boolean
+        是否每個學生各存成一個檔案
+    """
+    root, _ = os.path.splitext(grade_path)
+    return root + '_transcripts' + ( '' if per_student else '.xlsx' )
+
+
+if __name__ == '__main__': # 命令列與服務模式在ntuche_tmdm_cli.py中, python -m ntuche_tmdm 與 python -m ntuche_tmdm_cli 相同
+    from ntuche_tmdm_cli import main
+    sys.exit(main())
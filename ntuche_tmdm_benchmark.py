@@ -0,0 +1,311 @@
+"""
+產生測試成績檔並測量ntuche_tmdm各階段的執行時間與記憶體峰值, 可與儲存的基準結果比較
+
+Parameters
+----------
+core_course1 : list, str
+    本校所有微積分、普通化學與普通物理學課名的共通字串
+core_course_list: list, tuple
+    產生測試資料時使用的三科課程(課號, 課名, 學分), 包含不列入三科平均的實驗課
+department_list: list, str
+    產生測試資料時使用的系所名稱
+stage_list: list, str
+    測量效能的各個階段
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import openpyxl
+from ntuche_tmdm import arrangement
+
+core_course1 = ['微積分', '普通化學', '普通物理學']
+
+core_course_list = [
+    ('MATH4006', '微積分甲上', 4), ('MATH4007', '微積分甲下', 4),
+    ('CHEM1001', '普通化學甲上', 3), ('CHEM1002', '普通化學甲下', 3),
+    ('PHYS1001', '普通物理學甲上', 3), ('PHYS1002', '普通物理學甲下', 3),
+    ('CHEM1011', '普通化學實驗上', 1), ('PHYS1011', '普通物理學實驗上', 1),
+]
+
+department_list = ['化學系', '物理系', '電機工程學系', '機械工程學系', '生命科學系', '經濟學系']
+
+stage_list = ['df_gradedata', 'get_df_alldata', 'df_rankdata', 'save_df_data', 'stream_df_alldata', 'df_gradedata_csv']
+
+
+def generate_gradefile(path, n_students=1000, n_semesters=4, n_courses=40, seed=0, duplicate_rate=0.01, blank_rate=0.03, retake_rate=0.05):
+    """
+
+    產生與教務處匯出格式相同的測試成績檔:
+    第1列為標題、第2列為'\xa0\xa0'空白列、第3列為欄位名, 之後每列一筆成績, 學期由新到舊排列,
+    並包含沒有等第成績('\xa0\xa0')的課程、重複修習的三科課程與相鄰的重複成績;
+    path的副檔名為.csv時改存成內容相同的csv檔(相同的參數與種子產生的成績相同)
+
+    ----------
+    Parameters
+    ----------
+    path: str
+        測試成績檔的儲存路徑
+    n_students: int
+        學生人數
+    n_semesters: int
+        學期數
+    n_courses: int
+        一般課程(三科以外)的數量
+    seed: int
+        亂數種子, 相同的參數與種子會產生相同的成績檔
+    duplicate_rate: float
+        每筆成績重複出現的機率
+    blank_rate: float
+        成績為空白的機率
+    retake_rate: float
+        三科課程被重修的機率
+    courses: list, tuple
+        一般課程(課號, 課名, 學分)
+    semesters: list, tuple
+        所有學期(學年, 學期), 由新到舊排列
+    students: list, tuple
+        所有學生(學號, 姓名, 系所, 入學學年)
+    n_rows: int
+        成績檔中成績的筆數
+    delimited: boolean
+        是否存成csv檔
+    append: function
+        在成績檔最後加上一列的函數
+    """
+    rnd = random.Random(seed)
+    grade_list = list(arrangement.grade_dict)
+    courses = [('GEN%04d' % i, '一般課程%d' % i, rnd.choice([0, 1, 2, 2, 3, 3, 3, 4])) for i in range(n_courses)]
+    semesters = [(112 - i // 2, 2 - i % 2) for i in range(n_semesters)]
+    students = [('B%02d%06d' % (rnd.randint(8, 12), i), '學生%d' % i, rnd.choice(department_list), rnd.randint(1, 4)) for i in range(n_students)]
+    delimited = path.lower().endswith('.csv')
+    if delimited:
+        f = open(path, 'w', newline='', encoding='utf-8-sig')
+        append = csv.writer(f).writerow
+    else:
+        book = openpyxl.Workbook(write_only=True)
+        append = book.create_sheet(title='成績').append
+    append(['學生成績查詢'] + [None] * 9)
+    append(['\xa0\xa0'] * 10)
+    append(['學年', '學期', '學號', '學生姓名', '課號', '課名', '學分', '成績', '年級', '學生本學系'])
+    n_rows = 0
+    for year, semester in semesters:
+        for student_id, name, department, grade_year in students:
+            taken = rnd.sample(courses, min(len(courses), rnd.randint(4, 10)))
+            taken += [course for course in core_course_list if rnd.random() < 0.2 + retake_rate]
+            for course_id, course_name, credit in taken:
+                grade = rnd.choice(grade_list) if rnd.random() >= blank_rate else '\xa0\xa0'
+                row = [year, semester, student_id, name, course_id, course_name, credit, grade, grade_year, department]
+                append(row)
+                n_rows += 1
+                if rnd.random() < duplicate_rate:
+                    append(row)
+                    n_rows += 1
+    if delimited:
+        f.close()
+    else:
+        book.save(path)
+    return n_rows
+
+
+def measure(func, repeat=1):
+    """
+
+    測量func的執行時間(取repeat次中最快的一次)與最後一次執行的記憶體峰值
+
+    ----------
+    Parameters
+    ----------
+    func: function
+        要測量的函數, 每次呼叫都必須從頭執行
+    repeat: int
+        重複測量執行時間的次數
+    seconds: float
+        最快的執行時間(秒)
+    peak: int
+        記憶體峰值(bytes)
+    """
+    seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds = min(seconds, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def run_benchmark(grade_path, workdir, repeat=1, workers_list=(), csv_path=None):
+    """
+
+    分別測量讀取成績檔、計算平均、排名與存檔等各階段的執行時間與記憶體峰值,
+    並以workers_list中的每個行程數測量多行程的get_df_alldata(階段名稱為get_df_alldata_Nw, 記憶體峰值不含子行程)
+
+    ----------
+    Parameters
+    ----------
+    grade_path: str
+        測試成績檔的路徑
+    workdir: str
+        存放結果檔的資料夾
+    repeat: int
+        重複測量執行時間的次數
+    workers_list: list, int
+        要測量的行程數 eg. [2, 4, 8]
+    csv_path: str
+        內容相同的csv測試成績檔路徑, 用來測量讀取csv檔的時間(df_gradedata_csv), 沒有時不測量
+    studentrank: object of class "arrangement"
+        執行所有計算的物件(不使用暫存資料夾, 每次都重新解析成績檔)
+    result: dict, str:dict
+        每個階段的秒數與記憶體峰值(MB)
+    """
+    studentrank = arrangement(grade_path, core_course1, sidecar=False)
+    savepath = os.path.join(workdir, 'benchmark_results.xlsx')
+
+    def stage_gradedata():
+        studentrank.clear_cache()
+        studentrank.df_gradedata
+
+    def stage_save():
+        if os.path.exists(savepath):
+            os.remove(savepath)
+        studentrank.save_df_data(studentrank.df_alldata, savepath, 'results')
+
+    def stage_stream():
+        arrangement(grade_path, core_course1, streaming=True, sidecar=False).df_alldata
+    
+    def stage_csv():
+        arrangement(csv_path, core_course1, sidecar=False).df_gradedata
+
+    stage_func = {
+        'df_gradedata': stage_gradedata,
+        'get_df_alldata': studentrank.get_df_alldata,
+        'df_rankdata': lambda: studentrank.df_rankdata,
+        'save_df_data': stage_save,
+        'stream_df_alldata': stage_stream,
+        'df_gradedata_csv': stage_csv,
+    }
+    result = {}
+    for stage in stage_list:
+        if ( stage == 'df_gradedata_csv' ) and ( csv_path is None ):
+            continue
+        seconds, peak = measure(stage_func[stage], repeat)
+        result[stage] = {'seconds':seconds, 'peak_mb':peak / 2**20}
+    for workers in workers_list:
+        parallel = arrangement(grade_path, core_course1, sidecar=False, workers=workers)
+        parallel.df_gradedata
+        seconds, peak = measure(parallel.get_df_alldata, repeat)
+        result['get_df_alldata_%dw' % workers] = {'seconds':seconds, 'peak_mb':peak / 2**20}
+    return result
+
+
+def compare_baseline(result, baseline, tolerance=0.2, min_diff=None):
+    """
+
+    與儲存的基準結果比較, 回傳執行時間或記憶體峰值超過基準(1+tolerance)倍,
+    且差距大於min_diff的階段(避免極短的階段因量測誤差被誤判)
+
+    ----------
+    Parameters
+    ----------
+    result: dict, str:dict
+        這次測量的結果
+    baseline: dict, str:dict
+        儲存的基準結果
+    tolerance: float
+        容許的變慢比例 eg. 0.2代表容許比基準慢20%
+    min_diff: dict, str:float
+        各項目被視為退步的最小差距(秒, MB), 預設為{'seconds':0.05, 'peak_mb':1.0}
+    regressions: list, tuple
+        (階段, 項目, 基準值, 這次的值)
+    """
+    if min_diff is None:
+        min_diff = {'seconds':0.05, 'peak_mb':1.0}
+    regressions = []
+    for stage, values in result.items():
+        if stage not in baseline:
+            continue
+        for item in ('seconds', 'peak_mb'):
+            base = baseline[stage][item]
+            if values[item] > base * (1 + tolerance) and values[item] - base > min_diff[item]:
+                regressions.append((stage, item, base, values[item]))
+    return regressions
+
+
+def main(argv=None):
+    """
+
+    命令列入口
+    eg. python ntuche_tmdm_benchmark.py --students 2000 --semesters 8 --save-baseline
+        python ntuche_tmdm_benchmark.py --students 2000 --semesters 8
+        python ntuche_tmdm_benchmark.py --students 20000 --workers 2 4 8 (多行程的加速比)
+
+    ----------
+    Parameters
+    ----------
+    argv: list, str
+        命令列參數, 預設為sys.argv[1:]
+    case: str
+        測試資料的參數組合, 作為基準結果檔中的鍵
+    baselines: dict, str:dict
+        基準結果檔中所有參數組合的基準結果
+    """
+    parser = argparse.ArgumentParser(description='以產生的測試成績檔測量ntuche_tmdm各階段的效能')
+    parser.add_argument('--students', type=int, default=1000, help='學生人數')
+    parser.add_argument('--semesters', type=int, default=4, help='學期數')
+    parser.add_argument('--courses', type=int, default=40, help='一般課程的數量')
+    parser.add_argument('--seed', type=int, default=0, help='亂數種子')
+    parser.add_argument('--repeat', type=int, default=1, help='重複測量執行時間的次數(取最快的一次)')
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help='基準結果檔的路徑')
+    parser.add_argument('--save-baseline', action='store_true', help='將這次的結果存為基準')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='容許比基準慢或多用記憶體的比例')
+    parser.add_argument('--workers', type=int, nargs='+', default=[], help='另外測量以這些行程數計算get_df_alldata的時間與加速比 eg. --workers 2 4 8')
+    parser.add_argument('--workdir', default=None, help='存放測試成績檔與結果檔的資料夾(預設為暫存資料夾)')
+    args = parser.parse_args(argv)
+
+    case = 'students=%d semesters=%d courses=%d seed=%d' % (args.students, args.semesters, args.courses, args.seed)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = args.workdir or tmpdir
+        grade_path = os.path.join(workdir, 'benchmark_grade.xlsx')
+        start = time.perf_counter()
+        n_rows = generate_gradefile(grade_path, args.students, args.semesters, args.courses, args.seed)
+        print('%s: 產生%d筆成績 (%.2f s)' % (case, n_rows, time.perf_counter() - start))
+        csv_path = os.path.join(workdir, 'benchmark_grade.csv')
+        generate_gradefile(csv_path, args.students, args.semesters, args.courses, args.seed)
+        result = run_benchmark(grade_path, workdir, args.repeat, args.workers, csv_path)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baselines = json.load(f)
+    for stage, values in result.items():
+        base = baselines.get(case, {}).get(stage)
+        base_text = '  (基準 %.3f s, %.1f MB)' % (base['seconds'], base['peak_mb']) if base else ''
+        if stage.startswith('get_df_alldata_'):
+            base_text += '  (加速 %.2f倍, CPU核心數 %d)' % (result['get_df_alldata']['seconds'] / values['seconds'], os.cpu_count() or 1)
+        print('%-18s %9.3f s %9.1f MB%s' % (stage, values['seconds'], values['peak_mb'], base_text))
+
+    if args.save_baseline:
+        baselines[case] = result
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baselines, f, ensure_ascii=False, indent=2)
+        print('已將結果存為基準: %s' % args.baseline)
+        return 0
+    regressions = compare_baseline(result, baselines.get(case, {}), args.tolerance)
+    for stage, item, base, value in regressions:
+        print('效能退步: %s %s 基準 %.3f -> %.3f' % (stage, item, base, value), file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
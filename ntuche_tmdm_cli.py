@@ -0,0 +1,545 @@
+import numpy as np
+import os
+import sys
+import glob
+import time
+import argparse
+import json
+import shutil
+import tempfile
+import logging
+import contextlib
+import collections
+import http.server
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ntuche_tmdm import arrangement, cohort_union, results_path, transcripts_path
+
+logger = logging.getLogger('ntuche_tmdm')
+
+
+def process_grade_file(grade_path, core_course1, sheet_name='results', overwrite=False, streaming=False, sidecar=True, profile=False, course_groups=None, cumulative_gpa=False, rolling_gpa=0, workers=None,\
+                       grade_map=None, skip_invalid=False, transcripts=None):
+    """
+    
+    計算一個成績檔並將結果存成對應的_results檔(批次執行時每個行程各自處理一個成績檔)
+    
+    ----------
+    Parameters
+    ----------
+    grade_path: str
+        學生成績的檔案路徑
+    core_course1 : list, str
+        本校所有微積分、普通化學與普通物理學課名的共通字串
+    sheet_name: str
+        結果的excel檔中的工作表名稱
+    overwrite: boolean
+        結果檔已存在時是否取代原本的結果檔與成績單(否則會在原本的結果檔中新增工作表); 先存到暫存路徑, 全部成功後才取代
+    streaming: boolean
+        是否以串流方式讀取成績檔
+    sidecar: boolean
+        是否使用成績總表的暫存資料夾
+    profile: boolean
+        是否記錄各階段的執行時間等資料
+    course_groups: list, dict
+        三科課程的分組規則(預設由core_course1產生)
+    cumulative_gpa: boolean
+        是否加上每學期的累計平均
+    rolling_gpa: int
+        是否加上最近幾個學期的平均(0代表不加)
+    workers: int
+        計算每學期平均時同時執行的行程數(預設為單一行程)
+    grade_map: dict, str:(float or None)
+        grade_dict以外的等第成績對應的等第積分
+    skip_invalid: boolean
+        是否略過無法計算的成績
+    transcripts: str
+        是否另外存出每個學生的成績單('workbook'為單一檔案, 'files'為每個學生一個檔案, None為不存)
+    savepath: str
+        結果檔的儲存路徑
+    elapsed: float
+        處理這個成績檔所花的秒數
+    report: dict, str:dict
+        各階段的紀錄(未開啟profile時為None)
+    """
+    start = time.perf_counter()
+    savepath = results_path(grade_path)
+    studentrank = arrangement(grade_path, core_course1, streaming=streaming, sidecar=sidecar, profile=profile, course_groups=course_groups,\
+                              cumulative_gpa=cumulative_gpa, rolling_gpa=rolling_gpa, workers=workers, grade_map=grade_map, skip_invalid=skip_invalid)
+    df_alldata = studentrank.df_alldata
+    with replace_output(savepath, overwrite) as temp_path:
+        studentrank.save_df_data(df_alldata, temp_path, sheet_name)
+    if transcripts is not None:
+        per_student = transcripts == 'files'
+        with replace_output(transcripts_path(grade_path, per_student), overwrite) as temp_path:
+            studentrank.save_transcripts(temp_path, per_student=per_student)
+    elapsed = time.perf_counter() - start
+    report = studentrank.profile_report() if profile else None
+    return grade_path, savepath, len(df_alldata), elapsed, report
+
+
+@contextlib.contextmanager
+def replace_output(savepath, overwrite=False):
+    """
+    
+    overwrite為True時提供同一資料夾中的暫存路徑, 區塊內存檔成功後才以os.replace取代savepath(原本的檔案或資料夾),
+    計算或存檔失敗時原本的結果不會被刪除; overwrite為False時直接使用savepath
+    
+    ----------
+    Parameters
+    ----------
+    savepath: str
+        結果檔或成績單(檔案或資料夾)的路徑
+    overwrite: boolean
+        是否取代原本的檔案或資料夾
+    temp_dir: str
+        與savepath在同一資料夾中的暫存資料夾(os.replace不能跨磁碟)
+    temp_path: str
+        暫存路徑
+    """
+    if not overwrite:
+        yield savepath
+        return
+    temp_dir = tempfile.mkdtemp(prefix='.tmdm_', dir=os.path.dirname(os.path.abspath(savepath)))
+    try:
+        temp_path = os.path.join(temp_dir, os.path.basename(savepath))
+        yield temp_path
+        if os.path.isdir(savepath) and not os.path.islink(savepath): # os.replace不能取代非空的資料夾
+            shutil.rmtree(savepath)
+        os.replace(temp_path, savepath)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def is_output_path(grade_path):
+    """
+    
+    路徑是否為程式產生的檔案或資料夾(結果檔、成績單、暫存資料夾, 或在成績單與暫存資料夾中的檔案), 展開萬用字元時不視為成績檔
+    
+    ----------
+    Parameters
+    ----------
+    grade_path: str
+        展開萬用字元得到的路徑
+    parts: list, str
+        路徑中的每一層名稱
+    """
+    parts = os.path.normpath(grade_path).split(os.sep)
+    if parts[-1].endswith(('_results' + os.path.splitext(parts[-1])[1], '_transcripts.xlsx')):
+        return True
+    return any(parti.endswith(('_transcripts', arrangement.sidecar_suffix)) for parti in parts)
+
+
+class cohort_cache:
+    """
+    
+    服務模式中保存已讀取成績檔的arrangement物件(每個成績檔一個), 超過max_cohorts個時移除最久沒有使用的;
+    成績檔被修改時arrangement會自動重新讀取, 不需要清除
+    
+    ----------
+    Parameters
+    ----------
+    core_course1 : list, str
+        本校所有微積分、普通化學與普通物理學課名的共通字串
+    max_cohorts: int
+        最多保存的成績檔數量
+    root: str
+        可以讀取的成績檔所在的資料夾(包含子資料夾), 避免讀取其他位置的檔案
+    kwargs: dict
+        建立arrangement時的其他參數(streaming, sidecar, course_groups...)
+    cohorts: collections.OrderedDict, str:arrangement
+        成績檔的絕對路徑對應到arrangement物件, 依最後使用的先後排列
+    """
+    
+    def __init__(self, core_course1, max_cohorts=4, root='.', **kwargs):
+        self.core_course1 = core_course1
+        self.max_cohorts = max_cohorts
+        self.root = os.path.realpath(root)
+        self.kwargs = kwargs
+        self.cohorts = collections.OrderedDict()
+    
+    def resolve(self, grade_path):
+        """
+        
+        將成績檔路徑(相對於root)轉為絕對路徑, 不在root中時產生PermissionError, 檔案不存在時產生FileNotFoundError
+        
+        ----------
+        Parameters
+        ----------
+        grade_path: str
+            成績檔路徑
+        path: str
+            成績檔的絕對路徑
+        """
+        path = os.path.realpath(os.path.join(self.root, grade_path))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise PermissionError('成績檔不在%s中: %s' % (self.root, grade_path))
+        if not os.path.isfile(path):
+            self.cohorts.pop(path, None)
+            raise FileNotFoundError('找不到成績檔: %s' % grade_path)
+        return path
+    
+    def get(self, grade_path):
+        """
+        
+        取得成績檔的arrangement物件, 沒有保存時才建立
+        
+        ----------
+        Parameters
+        ----------
+        grade_path: str
+            成績檔路徑
+        studentrank: object of class "arrangement"
+            成績檔的arrangement物件
+        """
+        path = self.resolve(grade_path)
+        studentrank = self.cohorts.pop(path, None)
+        if studentrank is None:
+            studentrank = arrangement(path, self.core_course1, **self.kwargs)
+        self.cohorts[path] = studentrank
+        while len(self.cohorts) > self.max_cohorts:
+            self.cohorts.popitem(last=False)
+        return studentrank
+
+
+def json_safe(obj):
+    """
+    
+    將結果轉為可以存成JSON的型態: NaN轉為None, NumPy的數值轉為python的數值
+    
+    ----------
+    Parameters
+    ----------
+    obj: object
+        要轉換的dict、list或數值
+    """
+    if isinstance(obj, dict):
+        return {str(key):json_safe(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [json_safe(value) for value in obj]
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, float) and obj != obj:
+        return None
+    return obj
+
+
+class grade_request_handler(http.server.BaseHTTPRequestHandler):
+    """
+    
+    服務模式的HTTP請求處理(只接受GET, 結果為JSON):
+    /cohorts                                   目前保存的成績檔
+    /rank?file=111輔系.xlsx[&top=10|&percent=5]   依rank_keys排名的結果(可只取前幾名或前幾%)
+    /student?file=111輔系.xlsx&id=B11000000       單一學生的平均與三科成績(student_report)
+    /export?file=111輔系.xlsx[&sheet=results]     以xlsx檔下載df_rankdata
+    成績檔不存在時回應404, 不在root中時回應403, 參數錯誤或找不到欄位(KeyError)時回應400, 其他錯誤回應500
+    
+    ----------
+    Parameters
+    ----------
+    routes: dict, str:str
+        網址路徑對應的處理函數名稱
+    """
+    
+    routes = {'/cohorts':'get_cohorts', '/rank':'get_rank', '/student':'get_student', '/export':'get_export'}
+    
+    def do_GET(self):
+        """
+        
+        處理GET請求並回應結果
+        
+        ----------
+        Parameters
+        ----------
+        url: urllib.parse.SplitResult
+            請求的網址
+        query: dict, str:str
+            網址中的參數
+        start: float
+            開始處理的時間
+        """
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        start = time.perf_counter()
+        try:
+            if url.path not in self.routes:
+                raise LookupError('沒有這個網址: %s' % url.path)
+            status, content_type, body, headers = 200, 'application/json; charset=utf-8', None, {}
+            result = getattr(self, self.routes[url.path])(query)
+            if isinstance(result, tuple):
+                body, content_type, headers = result
+            else:
+                result['elapsed_ms'] = ( time.perf_counter() - start ) * 1000
+                body = json.dumps(json_safe(result), ensure_ascii=False).encode('utf-8')
+        except (KeyError, ValueError) as e: # KeyError也是LookupError, 需要先處理
+            status, content_type, body, headers = 400, 'application/json; charset=utf-8', json.dumps({'error':str(e)}, ensure_ascii=False).encode('utf-8'), {}
+        except (FileNotFoundError, LookupError) as e:
+            status, content_type, body, headers = 404, 'application/json; charset=utf-8', json.dumps({'error':str(e)}, ensure_ascii=False).encode('utf-8'), {}
+        except PermissionError as e:
+            status, content_type, body, headers = 403, 'application/json; charset=utf-8', json.dumps({'error':str(e)}, ensure_ascii=False).encode('utf-8'), {}
+        except Exception as e:
+            logger.exception('處理請求時發生錯誤: %s', self.path)
+            status, content_type, body, headers = 500, 'application/json; charset=utf-8', json.dumps({'error':'%s: %s' % (type(e).__name__, e)}, ensure_ascii=False).encode('utf-8'), {}
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        """
+        
+        將每個請求的紀錄改以logging輸出
+        """
+        logger.info('%s - %s', self.address_string(), format % args)
+    
+    def param(self, query, name):
+        """
+        
+        取得網址中的參數, 沒有時產生ValueError
+        
+        ----------
+        Parameters
+        ----------
+        query: dict, str:str
+            網址中的參數
+        name: str
+            參數名稱
+        """
+        if name not in query:
+            raise ValueError('缺少參數: %s' % name)
+        return query[name]
+    
+    def get_cohorts(self, query):
+        """
+        
+        /cohorts: 回傳目前保存的成績檔(依最後使用的先後排列)
+        """
+        cohorts = self.server.cohorts
+        return {'root':cohorts.root, 'max_cohorts':cohorts.max_cohorts, 'cohorts':[os.path.relpath(path, cohorts.root) for path in cohorts.cohorts]}
+    
+    def get_rank(self, query):
+        """
+        
+        /rank: 回傳排名後的所有學生, 或以top、percent參數只取前幾名或前幾%的學生
+        """
+        studentrank = self.server.cohorts.get(self.param(query, 'file'))
+        if 'top' in query:
+            df_rankdata = studentrank.top_students(int(query['top']))
+        elif 'percent' in query:
+            df_rankdata = studentrank.top_percent(float(query['percent']))
+        else:
+            df_rankdata = studentrank.df_rankdata
+        return {'file':query['file'], 'n':len(df_rankdata), 'data':json.loads(df_rankdata.to_json(orient='records', force_ascii=False))}
+    
+    def get_student(self, query):
+        """
+        
+        /student: 回傳學號為id參數的學生的student_report
+        """
+        studentrank = self.server.cohorts.get(self.param(query, 'file'))
+        student_id = self.param(query, 'id')
+        try:
+            return {'file':query['file'], 'data':studentrank.student_report(student_id)}
+        except KeyError:
+            raise LookupError('找不到學號: %s' % student_id)
+    
+    def get_export(self, query):
+        """
+        
+        /export: 將df_rankdata存成xlsx檔(工作表名稱為sheet參數)後回傳檔案內容
+        """
+        studentrank = self.server.cohorts.get(self.param(query, 'file'))
+        filename = os.path.basename(results_path(studentrank.grade_path))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            savepath = os.path.join(tmpdir, filename)
+            studentrank.save_df_data(studentrank.df_rankdata, savepath, query.get('sheet', 'results'))
+            with open(savepath, 'rb') as f:
+                body = f.read()
+        return body, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',\
+               {'Content-Disposition':"attachment; filename*=UTF-8''%s" % urllib.parse.quote(filename)}
+
+
+def make_server(core_course1, host='127.0.0.1', port=8000, max_cohorts=4, root='.', **kwargs):
+    """
+    
+    建立服務模式的HTTP伺服器(一次處理一個請求), 讀取過的成績檔會保存在記憶體中, 之後的排名與查詢不必重新讀取與計算
+    eg. server = make_server(['微積分', '普通化學', '普通物理學'], port=8000)
+        server.serve_forever()
+    
+    ----------
+    Parameters
+    ----------
+    core_course1 : list, str
+        本校所有微積分、普通化學與普通物理學課名的共通字串
+    host: str
+        伺服器的位址, 預設只接受本機的連線
+    port: int
+        伺服器的連接埠(0代表自動選擇)
+    max_cohorts: int
+        最多保存的成績檔數量
+    root: str
+        可以讀取的成績檔所在的資料夾
+    kwargs: dict
+        建立arrangement時的其他參數(streaming, sidecar, course_groups...)
+    server: http.server.HTTPServer
+        HTTP伺服器, 保存的成績檔在server.cohorts中
+    """
+    server = http.server.HTTPServer((host, port), grade_request_handler)
+    server.cohorts = cohort_cache(core_course1, max_cohorts, root, **kwargs)
+    return server
+
+
+def main(argv=None):
+    """
+    
+    命令列的批次執行入口, 以多個行程同時處理多個成績檔
+    eg. python -m ntuche_tmdm 111輔系.xlsx 111轉系.xlsx 111雙主修.xlsx --workers 3
+        python -m ntuche_tmdm "11*.xlsx"
+    加上--consolidate時改為將所有成績檔合併計算後再分回各自的結果檔
+    eg. python -m ntuche_tmdm 111輔系.xlsx 111轉系.xlsx 111雙主修.xlsx --consolidate
+    加上--serve時改為啟動服務模式(先讀取列出的成績檔, 之後以HTTP請求排名、查詢或下載結果)
+    eg. python -m ntuche_tmdm --serve 8000 "11*.xlsx"
+        (瀏覽 http://127.0.0.1:8000/rank?file=111輔系.xlsx)
+    
+    ----------
+    Parameters
+    ----------
+    argv: list, str
+        命令列參數, 預設為sys.argv[1:]
+    grade_path: list, str
+        展開萬用字元後的所有成績檔路徑
+    workers: int
+        同時執行的行程數
+    summary: list, tuple
+        每個成績檔的處理結果(成績檔路徑, 結果檔路徑, 學生人數, 秒數, 各階段的紀錄)
+    failed: list, tuple
+        處理失敗的成績檔與錯誤訊息
+    course_groups: list, dict
+        由--course-groups讀取的三科課程分組規則
+    grade_map: dict, str:(float or None)
+        由--grade-map讀取的等第成績對應表
+    server: http.server.HTTPServer
+        服務模式的HTTP伺服器
+    """
+    parser = argparse.ArgumentParser(prog='python -m ntuche_tmdm', description='計算申請轉系、輔系或雙主修學生的平均成績並存成_results.xlsx檔')
+    parser.add_argument('grade_path', nargs='*', help='成績檔路徑(xlsx或csv/tsv), 可使用萬用字元 eg. "111*.xlsx"')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='同時執行的行程數(預設為CPU核心數), 不適用於--consolidate')
+    parser.add_argument('-c', '--core-course', nargs='+', default=['微積分', '普通化學', '普通物理學'], help='三科課名的共通字串')
+    parser.add_argument('-s', '--sheet-name', default='results', help='結果檔的工作表名稱')
+    parser.add_argument('--overwrite', action='store_true', help='取代已存在的結果檔與成績單(計算與存檔都成功後才取代)')
+    parser.add_argument('--streaming', action='store_true', help='以串流方式讀取成績檔, 不適用於--consolidate')
+    parser.add_argument('--no-sidecar', action='store_true', help='不使用成績總表的暫存資料夾')
+    parser.add_argument('--profile', action='store_true', help='列出每個成績檔各階段的執行時間、呼叫次數、資料列數與讀寫的位元組數')
+    parser.add_argument('--course-groups', default=None, help='三科課程分組規則的JSON檔(內容為course_groups的list), 設定後不使用--core-course')
+    parser.add_argument('--serve', type=int, default=None, metavar='PORT', help='啟動服務模式, 在此連接埠接受排名、查詢與下載結果的HTTP請求')
+    parser.add_argument('--host', default='127.0.0.1', help='服務模式的位址(預設只接受本機的連線)')
+    parser.add_argument('--max-cohorts', type=int, default=4, help='服務模式最多保存在記憶體中的成績檔數量')
+    parser.add_argument('--root', default='.', help='服務模式可以讀取的成績檔所在的資料夾')
+    parser.add_argument('--cumulative-gpa', action='store_true', help='在每學期的總學分數後加上到該學期為止的累計平均')
+    parser.add_argument('--rolling-gpa', type=int, default=0, metavar='N', help='在每學期的總學分數後加上最近N個學期的平均 eg. --rolling-gpa 2')
+    parser.add_argument('--aggregate-workers', type=int, default=None, metavar='N', help='計算每學期平均時以N個行程分段計算(適合非常大的成績檔, 結果與單一行程相同)')
+    parser.add_argument('--grade-map', default=None, help='grade_dict以外的等第成績對應的等第積分的JSON檔 eg. {"通過": null, "X": 0}(null代表沒有等第成績)')
+    parser.add_argument('--skip-invalid', action='store_true', help='略過無法計算的成績(未知的等第成績、學分不是數值、缺少學號)而不是停止計算')
+    parser.add_argument('--transcripts', nargs='?', const='workbook', default=None, choices=['workbook', 'files'],\
+                        help='另外存出每個學生的成績單(workbook: 存成_transcripts.xlsx, files: _transcripts資料夾中每個學生一個檔案), 不適用於--consolidate')
+    parser.add_argument('--consolidate', action='store_true', help='將所有成績檔合併計算(同一學生只算一次), 再分別存成各自的結果檔, 並將同時申請多種的學生存成overlap_results.xlsx')
+    args = parser.parse_args(argv)
+    course_groups = None
+    if args.course_groups is not None:
+        with open(args.course_groups, encoding='utf-8') as f:
+            course_groups = json.load(f)
+    grade_map = None
+    if args.grade_map is not None:
+        with open(args.grade_map, encoding='utf-8') as f:
+            grade_map = json.load(f)
+    
+    grade_path = []
+    for pattern in args.grade_path: # 展開萬用字元(Windows的命令列不會自動展開)
+        matched = [path for path in sorted(glob.glob(pattern)) if os.path.isfile(path)] if glob.has_magic(pattern) else [pattern] # 萬用字元只取檔案, 不取資料夾
+        grade_path += [path for path in matched if ( path not in grade_path ) and not is_output_path(path)]
+    if args.serve is not None:
+        server = make_server(args.core_course, args.host, args.serve, args.max_cohorts, args.root, streaming=args.streaming,\
+                             sidecar=not args.no_sidecar, profile=args.profile, course_groups=course_groups, cumulative_gpa=args.cumulative_gpa, rolling_gpa=args.rolling_gpa,\
+                             workers=args.aggregate_workers, grade_map=grade_map, skip_invalid=args.skip_invalid)
+        failed = []
+        for grade_pathi in grade_path:
+            try:
+                server.cohorts.get(os.path.relpath(os.path.abspath(grade_pathi), server.cohorts.root)).df_alldata
+            except Exception as e:
+                failed.append((grade_pathi, '%s: %s' % (type(e).__name__, e)))
+        if failed:
+            server.server_close()
+            for grade_pathi, error in failed:
+                print('%-40s 失敗: %s' % (grade_pathi, error), file=sys.stderr)
+            return 1
+        print('服務模式: http://%s:%d (已讀取%d個成績檔, 按Ctrl+C結束)' % (args.host, server.server_address[1], len(server.cohorts.cohorts)))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return 0
+    if not grade_path:
+        parser.error('找不到任何成績檔')
+    if args.consolidate:
+        for option, value in [('--streaming', args.streaming), ('-j/--workers', args.workers is not None), ('--transcripts', args.transcripts is not None)]:
+            if value: # 合併計算只用一個行程讀取整個成績總表, 不會使用這些選項
+                parser.error('%s不能與--consolidate一起使用' % option)
+        start = time.perf_counter()
+        try:
+            union = cohort_union(grade_path, args.core_course, sidecar=not args.no_sidecar, profile=args.profile, course_groups=course_groups,\
+                                 cumulative_gpa=args.cumulative_gpa, rolling_gpa=args.rolling_gpa, workers=args.aggregate_workers,\
+                                 grade_map=grade_map, skip_invalid=args.skip_invalid)
+            savepaths = union.save_results(args.sheet_name, overwrite=args.overwrite)
+        except Exception as e:
+            print('%-40s 失敗: %s' % ('、'.join(grade_path), '%s: %s' % (type(e).__name__, e)), file=sys.stderr)
+            print('共 %d 個成績檔, 合併計算失敗, 總共 %.2f s' % (len(grade_path), time.perf_counter() - start))
+            return 1
+        for grade_pathi, savepath, df_data in zip(grade_path, savepaths, union.application_alldata.values()):
+            print('%-40s %6d 位學生  -> %s' % (grade_pathi, len(df_data), savepath))
+        print('同時申請多種的學生 %d 位 -> %s' % (len(union.df_overlapdata), savepaths[-1]))
+        for stage, stats in union.profile_report().items():
+            print('    %-20s %6d 次 %9.3f s %10d 列 %12d B 讀取 %12d B 寫入' % (stage, stats['calls'], stats['seconds'], stats['rows'], stats['bytes_read'], stats['bytes_written']))
+        print('共 %d 個成績檔, 合併後 %d 位學生, 總共 %.2f s' % (len(grade_path), len(union.df_alldata), time.perf_counter() - start))
+        return 0
+    workers = min(args.workers or os.cpu_count() or 1, len(grade_path))
+    
+    start = time.perf_counter()
+    summary = []
+    failed = []
+    kwargs = dict(core_course1=args.core_course, sheet_name=args.sheet_name, overwrite=args.overwrite, streaming=args.streaming, sidecar=not args.no_sidecar, profile=args.profile, course_groups=course_groups,\
+                  cumulative_gpa=args.cumulative_gpa, rolling_gpa=args.rolling_gpa, workers=args.aggregate_workers,\
+                  grade_map=grade_map, skip_invalid=args.skip_invalid, transcripts=args.transcripts)
+    if workers == 1:
+        for grade_pathi in grade_path:
+            try:
+                summary.append(process_grade_file(grade_pathi, **kwargs))
+            except Exception as e:
+                failed.append((grade_pathi, '%s: %s' % (type(e).__name__, e)))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(process_grade_file, grade_pathi, **kwargs):grade_pathi for grade_pathi in grade_path}
+            for future in as_completed(futures):
+                try:
+                    summary.append(future.result())
+                except Exception as e:
+                    failed.append((futures[future], '%s: %s' % (type(e).__name__, e)))
+    elapsed = time.perf_counter() - start
+    
+    summary.sort(key=lambda item: grade_path.index(item[0]))
+    for grade_pathi, savepath, n_students, seconds, report in summary:
+        print('%-40s %8.2f s  %6d 位學生  -> %s' % (grade_pathi, seconds, n_students, savepath))
+        for stage, stats in (report or {}).items():
+            print('    %-20s %6d 次 %9.3f s %10d 列 %12d B 讀取 %12d B 寫入' % (stage, stats['calls'], stats['seconds'], stats['rows'], stats['bytes_read'], stats['bytes_written']))
+    for grade_pathi, error in failed:
+        print('%-40s 失敗: %s' % (grade_pathi, error), file=sys.stderr)
+    print('共 %d 個成績檔, %d 個行程, 總共 %.2f s (各檔加總 %.2f s)' % (len(grade_path), workers, elapsed, sum(item[3] for item in summary)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
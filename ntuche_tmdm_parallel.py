@@ -0,0 +1,102 @@
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from ntuche_tmdm import arrangement
+
+
+def parallel_semester_sums(student, semester, grade, credit, n_students, n_semesters, workers):
+    """
+    
+    以workers個行程計算semester_sums: 將學生依位置分成連續的workers段, 成績陣列依學生位置穩定排序後只複製一次到共用記憶體,
+    每段學生的成績因此是連續的一段列, 由主行程算出每段的起訖列後, 各行程直接取出自己那一段(不必pickle整個陣列, 也不必掃描全部的成績);
+    穩定排序讓同一個學生的成績維持原本的順序, 所以結果與semester_sums完全相同, 也不受分段方式影響
+    
+    ----------
+    Parameters
+    ----------
+    student: np.array, int
+        每筆成績所屬學生的位置
+    semester: np.array, int
+        每筆成績所屬學期在sheetname中的位置
+    grade: np.array, float
+        每筆成績的等第積分
+    credit: np.array, float
+        每筆成績的學分數
+    n_students: int
+        學生人數
+    n_semesters: int
+        學期數
+    workers: int
+        同時執行的行程數
+    bounds: np.array, int
+        每段學生的起訖位置
+    order: np.array, int
+        依學生位置穩定排序的索引
+    row_bounds: np.array, int
+        排序後每段學生的成績的起訖列
+    blocks: list, shared_memory.SharedMemory
+        存放student、semester、grade與credit的共用記憶體
+    specs: list, tuple
+        每個陣列的(共用記憶體名稱, 長度, dtype)
+    allgrades: 2d np.array, float
+        不同學期的等第積分乘上學分數的總和(列為學生, 行為學期)
+    allcredits: 2d np.array, float
+        不同學期的總學分數(列為學生, 行為學期)
+    """
+    workers = min(workers, max(n_students, 1))
+    bounds = np.linspace(0, n_students, workers + 1).round().astype(int)
+    student = np.asarray(student, dtype=np.intp)
+    order = np.argsort(student, kind='stable')
+    row_bounds = np.searchsorted(student[order], bounds) # 沒有學號的成績(位置為-1)排在最前面, 不在任何一段中
+    blocks, specs = [], []
+    try:
+        for array in (student, np.asarray(semester, dtype=np.intp), np.asarray(grade, dtype=float), np.asarray(credit, dtype=float)):
+            blocks.append(shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1)))
+            np.take(array, order, out=np.ndarray(array.shape, dtype=array.dtype, buffer=blocks[-1].buf))
+            specs.append((blocks[-1].name, len(array), array.dtype.str))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(semester_sums_worker, [specs] * workers, bounds[:-1], bounds[1:], row_bounds[:-1], row_bounds[1:], [n_semesters] * workers))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    allgrades = np.concatenate([np.zeros((0, n_semesters))] + [allgradesi for allgradesi, _ in results])
+    allcredits = np.concatenate([np.zeros((0, n_semesters))] + [allcreditsi for _, allcreditsi in results])
+    return allgrades, allcredits
+
+
+def semester_sums_worker(specs, start, stop, row_start, row_stop, n_semesters):
+    """
+    
+    parallel_semester_sums在每個行程中執行的函數: 連接共用記憶體中(依學生位置排序)的成績陣列,
+    只取出第[row_start, row_stop)列, 也就是位置在[start, stop)的學生的成績來加總
+    
+    ----------
+    Parameters
+    ----------
+    specs: list, tuple
+        student、semester、grade與credit的(共用記憶體名稱, 長度, dtype)
+    start: int
+        這段學生的起始位置
+    stop: int
+        這段學生的結束位置(不包含)
+    row_start: int
+        這段學生的成績在排序後的起始列
+    row_stop: int
+        這段學生的成績在排序後的結束列(不包含)
+    n_semesters: int
+        學期數
+    blocks: list, shared_memory.SharedMemory
+        連接的共用記憶體
+    arrays: list, np.array
+        共用記憶體中的student、semester、grade與credit陣列
+    student: np.array, int
+        這段學生的每筆成績所屬學生的位置
+    """
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    arrays = [np.ndarray((length,), dtype=dtype, buffer=block.buf) for block, (_, length, dtype) in zip(blocks, specs)]
+    student, semester, grade, credit = [array[row_start:row_stop].copy() for array in arrays]
+    del arrays # 關閉共用記憶體前必須先釋放指向它的陣列
+    for block in blocks:
+        block.close()
+    return arrangement.semester_sums(student - start, semester, grade, credit, stop - start, n_semesters)
@@ -0,0 +1,248 @@
+import os
+import csv
+import json
+import shutil
+import threading
+import urllib.request
+import numpy as np
+import pandas as pd
+import openpyxl
+import pytest
+
+from ntuche_tmdm import arrangement, cohort_union
+from ntuche_tmdm_cli import make_server
+from ntuche_tmdm_benchmark import generate_gradefile, core_course1
+
+
+def modify_round_each(x, dec):
+    """
+
+    對每個值逐一呼叫modify_round(decimal的ROUND_HALF_UP)的結果, 作為modify_round_array的標準答案
+
+    ----------
+    Parameters
+    ----------
+    x: np.array, float
+        想要取四捨五入的數值
+    dec: int
+        四捨五入的精確度
+    """
+    return np.array([arrangement.modify_round(xi, dec) for xi in x], dtype=float)
+
+
+def half_values(rng, size, dec):
+    """
+
+    產生剛好在進位門檻上的值(eg. 4.165)與其前後相鄰的浮點數(±1 ulp), 是最容易四捨五入錯誤的情形
+
+    ----------
+    Parameters
+    ----------
+    rng: np.random.Generator
+        固定種子的亂數產生器
+    size: int
+        門檻值的個數
+    dec: int
+        四捨五入的精確度
+    half: np.array, float
+        進位門檻(n+0.5)/10**dec最接近的浮點數
+    """
+    half = ( rng.integers(0, 10**(dec+2), size) + 0.5 ) / 10**dec
+    half = np.concatenate([half, -half])
+    return np.concatenate([half, np.nextafter(half, np.inf), np.nextafter(half, -np.inf)])
+
+
+@pytest.mark.parametrize('dec', [0, 1, 2, 3, 4])
+def test_modify_round_array_random(dec):
+    rng = np.random.default_rng(20261018 + dec)
+    x = np.concatenate([rng.uniform(-100, 100, 20000), rng.uniform(0, 4.3, 20000), half_values(rng, 20000, dec)])
+    np.testing.assert_array_equal(arrangement.modify_round_array(x, dec), modify_round_each(x, dec))
+
+
+def test_modify_round_array_known_values():
+    x = np.array([4.165, 4.175, 2.675, 1.005, 0.125, 0.0, -0.0, -4.165, 3.9999999999999996, 1e16 + 0.5, 123456789.125])
+    np.testing.assert_array_equal(arrangement.modify_round_array(x), modify_round_each(x, 2))
+    assert arrangement.modify_round_array(np.array([4.165]))[0] == 4.17
+
+
+def test_modify_round_array_grade_averages():
+    # 真實的平均都是等第積分的加權平均, 以所有可能的等第積分與學分組合產生平均
+    rng = np.random.default_rng(20261018)
+    points = np.array(list(arrangement.grade_dict.values()))
+    grades = rng.choice(points, (20000, 12))
+    credits = rng.integers(0, 5, (20000, 12))
+    total = credits.sum(axis=1)
+    x = ( grades * credits ).sum(axis=1)[total > 0] / total[total > 0]
+    np.testing.assert_array_equal(arrangement.modify_round_array(x), modify_round_each(x, 2))
+
+
+def test_modify_round_array_nan():
+    x = np.array([np.nan, 4.165, np.nan])
+    np.testing.assert_array_equal(arrangement.modify_round_array(x), np.array([np.nan, 4.17, np.nan]))
+
+
+def write_gradefile(path, rows):
+    """
+
+    將成績寫成與教務處匯出格式相同的xlsx成績檔(第1列為標題、第2列為'\xa0\xa0'空白列、第3列為欄位名)
+
+    ----------
+    Parameters
+    ----------
+    path: str
+        成績檔的儲存路徑
+    rows: list, list
+        每一筆成績
+    book: openpyxl.Workbook
+        成績檔
+    sheet: openpyxl.worksheet
+        成績檔中的工作表
+    """
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.append(['學生成績查詢'] + [None] * 9)
+    sheet.append(['\xa0\xa0'] * 10)
+    sheet.append(['學年', '學期', '學號', '學生姓名', '課號', '課名', '學分', '成績', '年級', '學生本學系'])
+    for row in rows:
+        sheet.append(row)
+    book.save(path)
+    return str(path)
+
+
+def test_blank_row_dropped_in_batch_and_streaming(tmp_path):
+    rows = [
+        [112, 1, 'B10000001', '學生1', 'MATH4006', '微積分甲上', 4, 'A', 1, '化學系'],
+        [112, 1, 'B10000001', '學生1', 'CHEM1001', '普通化學甲上', 3, 'B+', 1, '化學系'],
+        ['\xa0\xa0'] * 10,
+        [112, 1, 'B10000002', '學生2', 'MATH4006', '微積分甲上', 4, 'X', 2, '物理系'],
+        [112, 1, 'B10000002', '學生2', 'PHYS1001', '普通物理學甲上', 3, 'A-', 2, '物理系'],
+        ]
+    path = write_gradefile(tmp_path / 'blank.xlsx', rows)
+    reference = write_gradefile(tmp_path / 'reference.xlsx', rows[:2] + rows[3:])
+    batch = arrangement(path, core_course1, sidecar=False, skip_invalid=True)
+    streaming = arrangement(path, core_course1, sidecar=False, skip_invalid=True, streaming=True)
+    df_gradedata, sheetname = batch.df_gradedata
+    assert sheetname == ['112_1']
+    assert df_gradedata['學號'].notna().all()
+    expected = arrangement(reference, core_course1, sidecar=False, skip_invalid=True).df_alldata
+    pd.testing.assert_frame_equal(batch.df_alldata, expected)
+    pd.testing.assert_frame_equal(streaming.df_alldata, expected, check_dtype=False)
+    # 刪除空白列後, 檢查結果中的列號仍為原本的列號
+    assert batch.validation_report['列號'].tolist() == streaming.validation_report['列號'].tolist() == [7]
+
+
+def test_csv_matches_xlsx_with_text_values_and_wide_rows(tmp_path):
+    # 年級欄中有文字(部分為數值的欄位), 且第三筆成績比欄位名多一欄
+    rows = [
+        [112, 1, 'B10000001', '學生1', 'MATH4006', '微積分甲上', 4, 'A', 1, '化學系'],
+        [112, 1, 'B10000001', '學生1', 'CHEM1001', '普通化學甲上', 3, 'B+', '一', '化學系'],
+        [112, 1, 'B10000002', '學生2', 'MATH4006', '微積分甲上', 4, 'A-', 2, '物理系', '備註'],
+        ]
+    path = write_gradefile(tmp_path / 'wide.xlsx', rows)
+    with open(tmp_path / 'wide.csv', 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerows([['學生成績查詢'], ['\xa0\xa0'] * 10, ['學年', '學期', '學號', '學生姓名', '課號', '課名', '學分', '成績', '年級', '學生本學系']] + rows)
+    expected = arrangement(path, core_course1, sidecar=False).df_gradedata[0]
+    df_gradedata = arrangement(str(tmp_path / 'wide.csv'), core_course1, sidecar=False).df_gradedata[0]
+    pd.testing.assert_frame_equal(df_gradedata, expected)
+    assert [type(value) for value in df_gradedata['年級']] == [int, str, int]
+
+
+@pytest.fixture(scope='module')
+def gradefile(tmp_path_factory):
+    """
+
+    以generate_gradefile產生的小型成績檔, 以及以批次方式(不使用暫存資料夾)計算的df_alldata作為其他讀取與計算方式的標準答案
+
+    ----------
+    Parameters
+    ----------
+    path: str
+        成績檔的路徑
+    baseline: arrangement
+        以批次方式計算的arrangement物件
+    """
+    path = str(tmp_path_factory.mktemp('gradefile') / 'cohort.xlsx')
+    generate_gradefile(path, n_students=40, n_semesters=3, n_courses=10, seed=20261018)
+    baseline = arrangement(path, core_course1, sidecar=False)
+    return path, baseline
+
+
+def read_rows(path):
+    """
+
+    讀取成績檔中的所有成績(不含前三列)
+
+    ----------
+    Parameters
+    ----------
+    path: str
+        成績檔的路徑
+    book: openpyxl.Workbook
+        以唯讀模式開啟的成績檔
+    """
+    book = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return [list(row) for row in book.worksheets[0].iter_rows(min_row=4, values_only=True)]
+    finally:
+        book.close()
+
+
+def test_sidecar_matches_baseline(gradefile, tmp_path):
+    path = str(tmp_path / 'cohort.xlsx')
+    shutil.copy(gradefile[0], path)
+    arrangement(path, core_course1).df_alldata # 建立暫存資料夾
+    studentrank = arrangement(path, core_course1)
+    pd.testing.assert_frame_equal(studentrank.df_alldata, gradefile[1].df_alldata)
+    assert studentrank.parse_count == 0
+
+
+def test_streaming_matches_baseline(gradefile):
+    studentrank = arrangement(gradefile[0], core_course1, sidecar=False, streaming=True)
+    pd.testing.assert_frame_equal(studentrank.df_alldata, gradefile[1].df_alldata, check_dtype=False)
+
+
+def test_csv_matches_baseline(gradefile, tmp_path):
+    path = str(tmp_path / 'cohort.csv')
+    generate_gradefile(path, n_students=40, n_semesters=3, n_courses=10, seed=20261018)
+    pd.testing.assert_frame_equal(arrangement(path, core_course1, sidecar=False).df_alldata, gradefile[1].df_alldata)
+
+
+def test_update_gradedata_matches_baseline(gradefile, tmp_path):
+    # 缺少最後30筆成績且有一筆成績錯誤的成績檔, 以update_gradedata補上與更正後應與完整的成績檔相同
+    rows = read_rows(gradefile[0])
+    partial = [list(row) for row in rows[:-30]]
+    partial[0][7] = 'F' if partial[0][7] != 'F' else 'A+'
+    studentrank = arrangement(write_gradefile(tmp_path / 'partial.xlsx', partial), core_course1, sidecar=False)
+    studentrank.df_alldata
+    df_delta = pd.DataFrame([rows[0]] + rows[-30:], columns=['學年', '學期', '學號', '學生姓名', '課號', '課名', '學分', '成績', '年級', '學生本學系'])
+    pd.testing.assert_frame_equal(studentrank.update_gradedata(df_delta), gradefile[1].df_alldata)
+
+
+def test_cohort_union_matches_baseline(gradefile, tmp_path):
+    # 第二個成績檔只有部分學生(成績與第一個成績檔相同), 合併後應與第一個成績檔單獨計算的結果相同
+    rows = read_rows(gradefile[0])
+    subset = sorted({row[2] for row in rows})[::3]
+    path = write_gradefile(tmp_path / 'subset.xlsx', [row for row in rows if row[2] in subset])
+    union = cohort_union([gradefile[0], path], core_course1, sidecar=False)
+    pd.testing.assert_frame_equal(union.df_alldata, gradefile[1].df_alldata)
+    application_alldata = union.application_alldata
+    pd.testing.assert_frame_equal(application_alldata['cohort'], gradefile[1].df_alldata)
+    pd.testing.assert_frame_equal(application_alldata['subset'], arrangement(path, core_course1, sidecar=False).df_alldata)
+    df_overlapdata = union.df_overlapdata
+    assert sorted(df_overlapdata['學號']) == subset
+    assert df_overlapdata['合併排名'].tolist() == df_overlapdata['cohort 排名'].tolist()
+
+
+def test_http_service_matches_baseline(gradefile):
+    server = make_server(core_course1, port=0, root=os.path.dirname(gradefile[0]), sidecar=False)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = 'http://127.0.0.1:%d/rank?file=%s' % (server.server_address[1], os.path.basename(gradefile[0]))
+        with urllib.request.urlopen(url) as response:
+            result = json.loads(response.read().decode('utf-8'))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert result['data'] == json.loads(gradefile[1].df_rankdata.to_json(orient='records', force_ascii=False))